@@ -0,0 +1,479 @@
+"""
+    Asyncio counterpart of Robinhood.py.
+
+    AsyncRobinhood exposes the same calls as the Robinhood class as
+    coroutines on a single aiohttp session, so many symbol and account checks
+    can be awaited together over one shared connection pool.
+"""
+
+
+import asyncio
+
+import aiohttp
+
+from Robinhood import Robinhood
+
+
+class AsyncRobinhood:
+    """Asyncio class for interacting with Robinhood
+
+    Usage
+    -----
+        async with AsyncRobinhood() as trader:
+            await trader.login(username, password)
+            quotes = await asyncio.gather(*[trader.quote(s) for s in symbols])
+    """
+
+    endpoints = Robinhood.endpoints
+    default_headers = Robinhood.default_headers
+    batch_size = Robinhood.batch_size
+
+    session = None
+    username = None
+    password = None
+    no_trade_list = list()
+
+    # Validation and helpers are shared with the synchronous client
+    _order_payload = Robinhood._order_payload
+    _unique_symbols = Robinhood._unique_symbols
+    _chunks = Robinhood._chunks
+    is_number = Robinhood.is_number
+
+    def __init__(self, base_url=None, pool_size=20, timeout=30):
+        """AsyncRobinhood class initialization
+
+        Parameters
+        ----------
+        base_url : str, optional
+            Replaces 'https://api.robinhood.com' in every endpoint, e.g. to point at a local stand-in server. (the default is None)
+        pool_size : int, optional
+            Maximum number of simultaneous connections. (the default is 20)
+        timeout : float, optional
+            Total timeout in seconds for each request. (the default is 30)
+        """
+
+        if base_url:
+            base_url = base_url.rstrip('/')
+            self.endpoints = {k: v.replace('https://api.robinhood.com', base_url)
+                              for k, v in Robinhood.endpoints.items()}
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.headers = {k: v for k, v in self.default_headers.items() if v is not None}
+        self.instrument_symbols = dict()
+        self.instrument_urls = dict()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        """Creates the aiohttp session and its connection pool.
+
+        """
+
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        """Closes the aiohttp session and its connections.
+
+        """
+
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _get(self, url, params=None):
+        """GET a URL and return the decoded JSON body
+
+        Parameters
+        ----------
+        url : str
+            URL to request
+        params : dict, optional
+            Query parameters
+
+        Returns
+        -------
+        dict
+            JSON response
+        """
+
+        await self.open()
+        async with self.session.get(url, params=params) as res:
+            res.raise_for_status()
+            return await res.json(content_type=None)
+
+    async def _post(self, url, data=None):
+        """POST form data to a URL and return the decoded JSON body
+
+        Parameters
+        ----------
+        url : str
+            URL to post to
+        data : dict, optional
+            Form data
+
+        Returns
+        -------
+        dict
+            JSON response, or an empty dict if the body is empty
+        """
+
+        await self.open()
+        if data:
+            data = {k: str(v) for k, v in data.items()}
+        async with self.session.post(url, data=data) as res:
+            res.raise_for_status()
+            body = await res.read()
+            return await res.json(content_type=None) if body.strip() else {}
+
+    async def _pages(self, url, params=None):
+        """Walks a paginated endpoint following its `next` links
+
+        Yields
+        ------
+        dict
+            Each item of each page's `results`
+        """
+
+        page = await self._get(url, params=params)
+        for item in page['results']:
+            yield item
+
+        while page.get('next'):
+            page = await self._get(page['next'])
+            for item in page['results']:
+                yield item
+
+    ###########################################################################
+    #                       Logging in and Account Info
+    ###########################################################################
+
+    async def login(self, username=None, password=None):
+        """Logs a user into a Robinhood Session
+
+        See `Robinhood.login`.
+
+        Returns
+        -------
+        bool
+            True if successful, False otherwise
+        """
+
+        if username:
+            self.username = username
+        if password:
+            self.password = password
+
+        assert self.username != None, 'Username must be included to login.'
+        assert self.password != None, 'Password must be included to login.'
+
+        payload = {
+            'password': self.password,
+            'username': self.username
+        }
+
+        try:
+            data = await self._post(self.endpoints['login'], data=payload)
+        except aiohttp.ClientResponseError:
+            print('Login Failed')
+            return False
+
+        if 'token' in data.keys():
+            self.headers['Authorization'] = 'Token ' + data['token']
+            self.session.headers.update({'Authorization': self.headers['Authorization']})
+            return True
+
+        return False
+
+    async def logout(self):
+        """Logs user out of session
+
+        """
+
+        await self._post(self.endpoints['logout'])
+
+    async def get_account(self):
+        """Fetch account information
+
+        Returns
+        -------
+        dict
+            `accounts` endpoint payload
+        """
+
+        res = await self._get(self.endpoints['accounts'])
+        return res['results'][0]
+
+    ###########################################################################
+    #                       GET ORDERS AND POSITIONS
+    ###########################################################################
+
+    async def orders(self, order_id=None):
+        """Returns all orders for the user.
+
+        See `Robinhood.orders`.
+
+        Yields
+        ------
+        dict
+            Orders data
+        """
+
+        if order_id:
+            yield await self._get(self.endpoints['orders'] + order_id + '/')
+            return
+
+        async for order in self._pages(self.endpoints['orders']):
+            yield order
+
+    async def open_orders(self):
+        """Returns open orders for the user.
+
+        Yields
+        ------
+        dict
+            Open orders data
+        """
+
+        async for order in self.orders():
+            if order['cancel']:
+                yield order
+
+    async def positions(self):
+        """Returns positions endpoint data
+
+        See `Robinhood.positions`.
+
+        Yields
+        ------
+        dict
+            Position Information
+        """
+
+        async for position in self._pages(self.endpoints['positions']):
+            yield position
+
+    async def nonzero_positions_held(self):
+        """Returns positions with shares held > 0
+
+        Yields
+        ------
+        dict
+            Positions with shares > 0
+        """
+
+        async for position in self.positions():
+            if float(position['quantity']) > 0:
+                yield position
+
+    ###########################################################################
+    #                           GET DATA
+    ###########################################################################
+
+    async def symbol_for_instrument(self, url):
+        """Symbol for an instrument URL, cached after the first lookup
+
+        Parameters
+        ----------
+        url : str
+            URL for the instrument
+
+        Returns
+        -------
+        str
+            Upper case ticker symbol
+        """
+
+        if url not in self.instrument_symbols:
+            res = await self._get(url)
+            self.instrument_symbols[url] = res['symbol'].upper()
+        return self.instrument_symbols[url]
+
+    async def instrument_for_symbol(self, symbol):
+        """Instrument URL for a symbol
+
+        Parameters
+        ----------
+        symbol : str
+            Ticker symbol (lower or upper case accepted)
+
+        Returns
+        -------
+        str
+            Instrument URL, or None if the symbol is unknown or has no active instrument
+        """
+
+        symbol = str(symbol).upper()
+        if symbol in self.instrument_urls:
+            return self.instrument_urls[symbol]
+
+        # Only an active, tradeable instrument is returned for reused or delisted tickers
+        res = await self._get(self.endpoints['instruments'], params={'symbol': symbol})
+        for instrument in res['results']:
+            self.instrument_symbols[instrument['url']] = instrument['symbol'].upper()
+            if (instrument['symbol'].upper() == symbol
+                    and instrument.get('state', 'active') == 'active'
+                    and instrument.get('tradeable', True)):
+                self.instrument_urls[symbol] = instrument['url']
+                return instrument['url']
+        return None
+
+    async def quote(self, symbol):
+        """Fetch stock quote
+
+        Parameters
+        ----------
+        symbol : str
+            Stock ticker symbol
+
+        Returns
+        -------
+        dict
+            JSON contents from `quotes` endpoint
+        """
+
+        assert symbol != None, 'You must specify a stock ticker symbol'
+        symbol = str(symbol).upper()
+        return await self._get(self.endpoints['quotes'] + symbol + '/')
+
+    async def quotes(self, symbols):
+        """Fetch quotes for many stocks, one request per `batch_size` symbols
+
+        The chunked requests are sent concurrently.
+
+        Returns
+        -------
+        dict
+            Quote dictionaries keyed by upper case symbol
+        """
+
+        return await self._multi_symbol(self.endpoints['quotes'], symbols)
+
+    async def fundamentals(self, symbol):
+        """Fetches Fundamentals data from Robinhood
+
+        Parameters
+        ----------
+        symbol : str
+            Stock symbol, can be lower or upper case.
+
+        Returns
+        -------
+        dict
+            JSON dictionary of fundamentals data
+        """
+
+        symbol = str(symbol).upper()
+        return await self._get(self.endpoints['fundamentals'] + symbol + '/')
+
+    async def fundamentals_many(self, symbols):
+        """Fetches Fundamentals data for many stocks, one request per `batch_size` symbols
+
+        Returns
+        -------
+        dict
+            Fundamentals dictionaries keyed by upper case symbol
+        """
+
+        return await self._multi_symbol(self.endpoints['fundamentals'], symbols)
+
+    async def high_52_weeks(self, symbol):
+        """52 week high for a given stock symbol
+
+        Returns
+        -------
+        float
+            52 week high dollar amount for the given symbol.
+        """
+
+        x = (await self.fundamentals(symbol))['high_52_weeks']
+        return float(x)
+
+    async def get_historical_quotes(self, symbol, interval='day', span='year'):
+        """Fetches historical quote data for a stock
+
+        See `Robinhood.get_historical_quotes`.
+
+        Returns
+        -------
+        Dict
+            `historicals` endpoint payload
+        """
+
+        params = {'symbols': symbol.upper(),
+                  'interval': interval,
+                  'span': span}
+        return await self._get(self.endpoints['historicals'], params=params)
+
+    async def _multi_symbol(self, url, symbols):
+        """Requests a multi-symbol endpoint in concurrent chunks
+
+        Returns
+        -------
+        dict
+            Results keyed by upper case symbol
+        """
+
+        symbols = self._unique_symbols(symbols)
+        chunks = list(self._chunks(symbols, self.batch_size))
+        pages = await asyncio.gather(*[
+            self._get(url, params={'symbols': ','.join(chunk)}) for chunk in chunks])
+
+        results = dict()
+        for chunk, page in zip(chunks, pages):
+            for symbol, item in zip(chunk, page['results']):
+                results[symbol] = item
+        return results
+
+    ###########################################################################
+    #                           TRADE ACTIONS
+    ###########################################################################
+
+    async def cancel_order(self, order_id=None, url=None):
+        """Cancel an order by order ID or URL
+
+        Returns
+        -------
+        bool
+            True if successful, false otherwise
+        """
+
+        if order_id is not None:
+            url = self.endpoints['cancel_order'] + str(order_id) + '/cancel/'
+        else:
+            assert url, "An Order ID or URL must be provided to cancel an order"
+
+        res = await self._post(url)
+        return res == {}
+
+    async def place_order(self, symbol, quantity, trigger, order_type, side, time_in_force, stop_price=0.0, price=0.0):
+        """Places an order
+
+        See `Robinhood.place_order` for the parameters.
+
+        Returns
+        -------
+        Dict
+            Dictionary containing order results.
+        """
+
+        symbol = symbol.upper()
+        self.no_trade_list = [x.upper() for x in self.no_trade_list]
+        assert symbol not in self.no_trade_list, 'You may not trade a stock in your no trade list'
+
+        instrument, account = await asyncio.gather(self.instrument_for_symbol(symbol),
+                                                   self.get_account())
+        payload = self._order_payload(symbol, instrument, account['url'], quantity,
+                                      trigger, order_type, side, time_in_force, stop_price, price)
+
+        return await self._post(self.endpoints['orders'], data=payload)
@@ -0,0 +1,255 @@
+"""
+    Offline backtest of the Robinhood_Trailing_Stop sell rule.
+
+    Replays Robinhood_Trailing_Stop.check_stop over historical bars for a
+    grid of (trailing_percent, limit_percent, check_interval) values. Within
+    a symbol every parameter combination is evaluated at once with NumPy;
+    symbols are spread across a process pool.
+
+    Model
+    -----
+    The position is bought at the close of the first bar. Every
+    check_interval bars the close is compared with the stop,
+    (1 - trailing_percent) * high, where high is the rolling high of the last
+    high_window bars (252 daily bars ~ the 52 week high used live). When the
+    stop is hit a good-for-day limit sell at (1 - limit_percent) * close is
+    placed for the next bar. It fills at max(open, limit) if that bar trades
+    at or above the limit, otherwise it expires and the rule is checked again
+    later. Positions never sold are valued at the last close.
+"""
+
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Indicators
+from Historical_Cache import Historical_Cache
+
+
+def parameter_grid(trailing_percents, limit_percents, check_intervals=(1,)):
+    """Every combination of the parameter values
+
+    Parameters
+    ----------
+    trailing_percents : iterable of float
+        Trailing percents as decimals
+    limit_percents : iterable of float
+        Limit percents as decimals
+    check_intervals : iterable of int, optional
+        Bars between checks (the default is (1,), which checks every bar)
+
+    Returns
+    -------
+    dict
+        'trailing_percent', 'limit_percent' and 'check_interval' arrays of equal length
+    """
+
+    combos = list(itertools.product(trailing_percents, limit_percents, check_intervals))
+    return {
+        'trailing_percent': np.array([x[0] for x in combos], dtype=np.float64),
+        'limit_percent': np.array([x[1] for x in combos], dtype=np.float64),
+        'check_interval': np.array([x[2] for x in combos], dtype=np.int64),
+    }
+
+
+def run_symbol(bars, grid, high_window=252):
+    """Backtests every parameter combination on one symbol
+
+    Parameters
+    ----------
+    bars : dict or numpy.ndarray
+        'open', 'high', 'low', 'close' arrays sorted by time
+    grid : dict
+        Parameter arrays from parameter_grid
+    high_window : int, optional
+        Bars in the rolling high (the default is 252)
+
+    Returns
+    -------
+    dict
+        Arrays with one value per parameter combination:
+            'return'        exit price / entry price - 1
+            'triggered'     bool, a sell order was placed at least once
+            'sold'          bool, a sell order filled
+            'bars_held'     bars from entry to the fill (or the end)
+            'expired'       number of sell orders that did not fill
+        None if there are fewer than 2 bars, e.g. nothing is cached.
+    """
+
+    open_ = np.asarray(bars['open'], dtype=np.float64)
+    high = np.asarray(bars['high'], dtype=np.float64)
+    close = np.asarray(bars['close'], dtype=np.float64)
+    n = len(close)
+    p = len(grid['trailing_percent'])
+    if n < 2:
+        return None
+
+    result = dict()
+
+    entry = close[0]
+    rolling_high = Indicators.rolling_max(high[None, :], min(high_window, n))[0]
+    # Before a full window is available use the running high, like a young listing
+    rolling_high = np.where(np.isnan(rolling_high), np.fmax.accumulate(high), rolling_high)
+
+    # (params, time) masks; the last bar has no next bar to sell into
+    t = np.arange(n - 1)
+    tp = grid['trailing_percent'][:, None]
+    lp = grid['limit_percent'][:, None]
+    k = grid['check_interval'][:, None]
+
+    checked = (t[None, :] % k) == 0
+    triggered = checked & (close[None, :-1] <= (1 - tp) * rolling_high[None, :-1])
+    limit = np.round((1 - lp) * close[None, :-1], 2)
+    filled = triggered & (high[None, 1:] >= limit)
+
+    any_fill = filled.any(axis=1)
+    first_fill = np.argmax(filled, axis=1)
+    fill_price = np.maximum(open_[1:][first_fill], limit[np.arange(p), first_fill])
+
+    exit_price = np.where(any_fill, fill_price, close[-1])
+    result['return'] = exit_price / entry - 1
+    result['triggered'] = triggered.any(axis=1)
+    result['sold'] = any_fill
+    result['bars_held'] = np.where(any_fill, first_fill + 1, n - 1)
+
+    # Orders placed before the fill (or over the whole run) that expired
+    before = t[None, :] < np.where(any_fill, first_fill, n - 1)[:, None]
+    result['expired'] = (triggered & ~filled & before).sum(axis=1)
+
+    return result
+
+
+def _run_cached(directory, symbol, interval, grid, high_window):
+    """Process pool worker: memory-maps a symbol's cached bars and backtests it"""
+
+    bars = Historical_Cache(None, directory).read(symbol, interval)
+    return symbol, run_symbol(bars, grid, high_window)
+
+
+def _run_bars(symbol, bars, grid, high_window):
+    """Process pool worker for bars passed in directly"""
+
+    return symbol, run_symbol(bars, grid, high_window)
+
+
+def summarize(results, grid):
+    """Aggregates per-symbol results into per-parameter statistics
+
+    Parameters
+    ----------
+    results : dict
+        run_symbol results keyed by symbol
+    grid : dict
+        Parameter arrays from parameter_grid
+
+    Returns
+    -------
+    list of dict
+        One dictionary per parameter combination with the parameters and
+        'symbols', 'mean_return', 'median_return', 'win_rate',
+        'trigger_rate', 'sell_rate', 'mean_bars_held' and 'expired_orders'.
+        Symbols without a result (too few bars) are left out of the
+        statistics and counted in 'skipped_symbols'.
+    """
+
+    skipped = sum(1 for x in results.values() if x is None)
+    results = {s: x for s, x in results.items() if x is not None}
+    if not results:
+        return []
+
+    returns = np.stack([x['return'] for x in results.values()])
+    triggered = np.stack([x['triggered'] for x in results.values()])
+    sold = np.stack([x['sold'] for x in results.values()])
+    held = np.stack([x['bars_held'] for x in results.values()])
+    expired = np.stack([x['expired'] for x in results.values()])
+
+    stats = {
+        'mean_return': returns.mean(axis=0),
+        'median_return': np.median(returns, axis=0),
+        'win_rate': (returns > 0).mean(axis=0),
+        'trigger_rate': triggered.mean(axis=0),
+        'sell_rate': sold.mean(axis=0),
+        'mean_bars_held': held.mean(axis=0),
+        'expired_orders': expired.sum(axis=0),
+    }
+
+    summary = list()
+    for i in range(len(grid['trailing_percent'])):
+        row = {
+            'trailing_percent': float(grid['trailing_percent'][i]),
+            'limit_percent': float(grid['limit_percent'][i]),
+            'check_interval': int(grid['check_interval'][i]),
+            'symbols': len(results),
+            'skipped_symbols': skipped,
+        }
+        for name, values in stats.items():
+            row[name] = values[i].item()
+        summary.append(row)
+    return summary
+
+
+def backtest(bars_by_symbol, grid, high_window=252, max_workers=None):
+    """Backtests a parameter grid over bars held in memory
+
+    Parameters
+    ----------
+    bars_by_symbol : dict
+        Arrays with 'open', 'high', 'low', 'close' keyed by symbol
+    grid : dict
+        Parameter arrays from parameter_grid
+    high_window : int, optional
+        Bars in the rolling high (the default is 252)
+    max_workers : int, optional
+        Processes to use, 1 runs in this process (the default is None, which uses one per CPU)
+
+    Returns
+    -------
+    list of dict
+        Per-parameter statistics from summarize
+    """
+
+    if max_workers == 1:
+        results = dict(_run_bars(s, b, grid, high_window) for s, b in bars_by_symbol.items())
+        return summarize(results, grid)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_bars, s, b, grid, high_window)
+                   for s, b in bars_by_symbol.items()]
+        results = dict(f.result() for f in futures)
+    return summarize(results, grid)
+
+
+def backtest_cached(directory, symbols, grid, interval='day', high_window=252, max_workers=None):
+    """Backtests a parameter grid over bars in a Historical_Cache directory
+
+    Each worker memory-maps its symbol's cache file itself, so no bar data
+    is copied between processes.
+
+    Parameters
+    ----------
+    directory : str
+        Historical_Cache directory
+    symbols : iterable of str
+        Symbols to backtest
+    grid : dict
+        Parameter arrays from parameter_grid
+    interval : str, optional
+        Bar interval of the cached data (the default is 'day')
+    high_window : int, optional
+        Bars in the rolling high (the default is 252)
+    max_workers : int, optional
+        Processes to use (the default is None, which uses one per CPU)
+
+    Returns
+    -------
+    list of dict
+        Per-parameter statistics from summarize
+    """
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_cached, directory, str(s).upper(), interval, grid, high_window)
+                   for s in symbols]
+        results = dict(f.result() for f in futures)
+    return summarize(results, grid)
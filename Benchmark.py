@@ -0,0 +1,271 @@
+"""
+    Offline benchmarks against the Fake_Robinhood stand-in server.
+
+    The server runs in its own process so CPU time measures only the client.
+    Each benchmark reports, as the median over its repeats, the number of
+    requests the server received, the wall time and the client CPU time.
+
+        python Benchmark.py --positions 150 --latency 0.02
+        python Benchmark.py --parsers
+"""
+
+
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import statistics
+import time
+
+import requests
+
+
+def _serve(conn, latency, options):
+    """Child process: runs the stand-in server and sends back its URL"""
+
+    from Fake_Robinhood import Fake_Robinhood
+
+    server = Fake_Robinhood(latency=latency, **options)
+    conn.send(server.url)
+    server.server.serve_forever()
+
+
+class Benchmark:
+    """Runs client benchmarks against a Fake_Robinhood server process
+
+    """
+
+    def __init__(self, latency=0.0, repeat=3, **data_options):
+        """Benchmark initialization
+
+        Parameters
+        ----------
+        latency : float, optional
+            Seconds the server adds to each response (the default is 0.0)
+        repeat : int, optional
+            Runs per benchmark (the default is 3)
+        **data_options
+            Data sizes for the server, see Fake_Robinhood.Fake_Data
+        """
+
+        self.latency = latency
+        self.repeat = repeat
+        self.data_options = data_options
+        self.process = None
+        self.url = None
+        self.results = dict()
+
+    def start(self):
+        """Starts the server process.
+
+        """
+
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, daemon=True,
+                                               args=(child, self.latency, self.data_options))
+        self.process.start()
+        self.url = parent.recv()
+
+    def stop(self):
+        """Stops the server process.
+
+        """
+
+        gc.collect()    # Let clients log out while the server is still up
+        self.process.terminate()
+        self.process.join()
+
+    def server_requests(self):
+        """Requests received by the server since the last call
+
+        Returns
+        -------
+        dict
+            Request counts keyed by logical endpoint name
+        """
+
+        return requests.post(self.url + '/__stats__/').json()
+
+    def measure(self, name, func, setup=None):
+        """Runs a benchmark `repeat` times and records the medians
+
+        Parameters
+        ----------
+        name : str
+            Benchmark name
+        func : callable
+            Called with the result of setup (or no arguments)
+        setup : callable, optional
+            Called before each run, not measured (the default is None)
+
+        Returns
+        -------
+        dict
+            'requests', 'wall' and 'cpu' medians plus the per-endpoint request counts of the last run
+        """
+
+        runs = list()
+        for _ in range(self.repeat):
+            args = (setup(),) if setup else ()
+            gc.collect()    # Earlier clients log out when collected
+            self.server_requests()
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            func(*args)
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+            counts = self.server_requests()
+            runs.append((sum(counts.values()), wall, cpu, counts))
+
+        result = {
+            'requests': statistics.median(x[0] for x in runs),
+            'wall': statistics.median(x[1] for x in runs),
+            'cpu': statistics.median(x[2] for x in runs),
+            'endpoints': runs[-1][3],
+        }
+        self.results[name] = result
+        return result
+
+    def trader(self):
+        """Logged in Robinhood client pointed at the server"""
+
+        from Robinhood import Robinhood
+
+        trader = Robinhood(base_url=self.url)
+        trader.login(username='benchmark', password='benchmark')
+        return trader
+
+    def run_all(self):
+        """Runs every benchmark
+
+        Returns
+        -------
+        dict
+            Results keyed by benchmark name
+        """
+
+        from Finviz import Finviz
+        from Robinhood_Trailing_Stop import Robinhood_Trailing_Stop
+        from Zacks import Zacks
+
+        def trailing_stop():
+            trailing = Robinhood_Trailing_Stop('benchmark', 'benchmark', 0.1, 0.01, trader=self.trader())
+            trailing.cancel_wait = 0    # Measure the client, not the fixed pause
+            return trailing
+
+        self.measure('check_stocks', lambda t: t.check_stocks(), setup=trailing_stop)
+        self.measure('open_orders', lambda t: list(t.open_orders()), setup=self.trader)
+        self.measure('place_order', lambda t: t.place_order('S0001', 1, 'immediate', 'limit', 'sell', 'gfd', price=1.0),
+                     setup=self.trader)
+
+        screen = self.url + '/screener.ashx?v=111&f=benchmark'
+        self.measure('finviz_get_stocks', lambda f: f.get_stocks(screen), setup=Finviz)
+        self.measure('finviz_get_screen', lambda f: f.get_screen(screen), setup=Finviz)
+
+        symbols = ['S{:04d}'.format(i) for i in range(20)]
+        zacks = Zacks(base_url=self.url)
+        self.measure('zacks_rank', lambda: [zacks.zacks_rank(x) for x in symbols])
+
+        return self.results
+
+    def run_parsers(self, pages=50):
+        """Times each HTML extraction backend on generated Finviz and Zacks pages
+
+        Runs in this process without the server. Each backend's output is
+        checked against the BeautifulSoup backend.
+
+        Parameters
+        ----------
+        pages : int, optional
+            Pages of each kind parsed per run (the default is 50)
+
+        Returns
+        -------
+        dict
+            Results keyed by benchmark name
+        """
+
+        import Html_Extract
+        from Fake_Robinhood import Fake_Data
+
+        data = Fake_Data('http://localhost', screener_results=pages * 20)
+        screens = [data.screener_page(1 + i * 20).encode() for i in range(pages)]
+        quotes = [data.zacks_page(x).encode() for x in data.symbols[:pages]]
+
+        def finviz(backend):
+            return [backend.texts(x, 'a', 'screener-link-primary') for x in screens]
+
+        def finviz_rows(backend):
+            return [backend.rows(x, 'a', 'screener-link-primary') for x in screens]
+
+        def zacks(backend):
+            return [backend.first_html(x, 'div', 'zr_rankbox') for x in quotes]
+
+        reference = Html_Extract.get_backend('bs4')
+        expected = (finviz(reference), finviz_rows(reference), [x is not None for x in zacks(reference)])
+
+        for name in Html_Extract.available_backends():
+            backend = Html_Extract.get_backend(name)
+            assert finviz(backend) == expected[0], 'Backend {} disagrees on Finviz pages'.format(name)
+            assert finviz_rows(backend) == expected[1], 'Backend {} disagrees on Finviz rows'.format(name)
+            assert [x is not None for x in zacks(backend)] == expected[2], \
+                'Backend {} disagrees on Zacks pages'.format(name)
+
+            for kind, func in (('finviz', finviz), ('finviz_rows', finviz_rows), ('zacks', zacks)):
+                runs = list()
+                for _ in range(self.repeat):
+                    wall = time.perf_counter()
+                    cpu = time.process_time()
+                    func(backend)
+                    runs.append((time.perf_counter() - wall, time.process_time() - cpu))
+                self.results['parse_{}_{}'.format(kind, name)] = {
+                    'requests': 0,
+                    'wall': statistics.median(x[0] for x in runs),
+                    'cpu': statistics.median(x[1] for x in runs),
+                    'endpoints': {},
+                }
+
+        return self.results
+
+    def report(self):
+        """Formats the results as a table
+
+        Returns
+        -------
+        str
+            One line per benchmark
+        """
+
+        lines = ['{:<26} {:>9} {:>10} {:>10}'.format('benchmark', 'requests', 'wall (s)', 'cpu (s)')]
+        for name, result in self.results.items():
+            lines.append('{:<26} {:>9} {:>10.3f} {:>10.3f}'.format(
+                name, result['requests'], result['wall'], result['cpu']))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the clients against a local stand-in server.')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--positions', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--screener-results', type=int, default=1000)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--parsers', action='store_true', help='only benchmark the HTML extraction backends')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    bench = Benchmark(latency=args.latency, repeat=args.repeat, positions=args.positions,
+                      orders=args.orders, screener_results=args.screener_results)
+    if args.parsers:
+        bench.run_parsers()
+    else:
+        bench.start()
+        try:
+            bench.run_all()
+        finally:
+            bench.stop()
+
+    print(json.dumps(bench.results, indent=2) if args.json else bench.report())
@@ -0,0 +1,456 @@
+"""
+    Local stand-in for the Robinhood API, Finviz screener and Zacks quotes.
+
+    Serves generated data for the endpoints in Robinhood.endpoints with
+    pagination, configurable latency and configurable data sizes, so the
+    clients can be benchmarked and tested offline:
+
+        server = Fake_Robinhood(positions=150, latency=0.02)
+        server.start()
+        trader = Robinhood(base_url=server.url)
+        zacks = Zacks(base_url=server.url)
+        finviz_url = server.url + '/screener.ashx?v=111&f=cap_large'
+
+    GET /__stats__/ returns request counts per logical endpoint and POST
+    /__stats__/ returns and resets them. Run as a script to serve until
+    interrupted.
+"""
+
+
+import argparse
+import collections
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class Fake_Data:
+    """Generated account and market data served by Fake_Robinhood
+
+    """
+
+    def __init__(self, base_url, symbols=500, positions=50, orders=1000, bars=252,
+                 screener_results=1000, page_size=100, seed=0):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.screener_results = screener_results
+        self.lock = threading.Lock()
+        rng = random.Random(seed)
+
+        self.symbols = ['S{:04d}'.format(i) for i in range(symbols)]
+        self.instruments = dict()
+        self.prices = dict()
+        for symbol in self.symbols:
+            self.instruments[symbol] = {
+                'id': symbol.lower(),
+                'url': '{}/instruments/{}/'.format(base_url, symbol.lower()),
+                'symbol': symbol,
+                'name': symbol + ' Inc',
+                'tradeable': True,
+                'state': 'active',
+                'type': 'stock',
+            }
+            self.prices[symbol] = round(rng.uniform(5, 500), 2)
+        self.by_url = {x['url']: s for s, x in self.instruments.items()}
+
+        self.account = {
+            'url': base_url + '/accounts/FAKE0001/',
+            'account_number': 'FAKE0001',
+            'cash': '10000.00',
+            'cash_held_for_orders': '0.00',
+            'unsettled_funds': '0.00',
+            'buying_power': '10000.00',
+        }
+
+        self.positions = list()
+        for symbol in self.symbols[:positions]:
+            self.positions.append({
+                'instrument': self.instruments[symbol]['url'],
+                'account': self.account['url'],
+                'quantity': '{:.5f}'.format(rng.randint(1, 100)),
+                'average_buy_price': '{:.4f}'.format(self.prices[symbol] * rng.uniform(0.7, 1.1)),
+                'shares_held_for_sells': '0.00000',
+                'url': '{}/positions/FAKE0001/{}/'.format(base_url, symbol.lower()),
+            })
+
+        start = datetime.datetime(2018, 1, 1)
+        self.orders = list()
+        for i in range(orders):
+            symbol = rng.choice(self.symbols)
+            stamp = (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            self.orders.append(self._order(symbol, rng.choice(['buy', 'sell']),
+                                           rng.choice(['filled', 'cancelled', 'filled', 'queued']),
+                                           '1.00000', self.prices[symbol], stamp))
+
+        self.bars = bars
+        self.requests = collections.Counter()
+
+    def _order(self, symbol, side, state, quantity, price, stamp):
+        order_id = str(uuid.uuid4())
+        url = '{}/orders/{}/'.format(self.base_url, order_id)
+        return {
+            'id': order_id,
+            'url': url,
+            'cancel': url + 'cancel/' if state in ('queued', 'confirmed') else None,
+            'instrument': self.instruments[symbol]['url'],
+            'account': self.account['url'],
+            'side': side,
+            'state': state,
+            'quantity': quantity,
+            'price': '{:.2f}'.format(float(price)),
+            'type': 'limit',
+            'trigger': 'immediate',
+            'time_in_force': 'gfd',
+            'created_at': stamp,
+            'updated_at': stamp,
+        }
+
+    def now(self):
+        return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def quote(self, symbol):
+        if symbol not in self.instruments:
+            return None
+        price = self.prices[symbol]
+        return {
+            'symbol': symbol,
+            'last_trade_price': '{:.4f}'.format(price),
+            'bid_price': '{:.4f}'.format(price - 0.01),
+            'ask_price': '{:.4f}'.format(price + 0.01),
+            'previous_close': '{:.4f}'.format(price),
+            'trading_halted': False,
+            'has_traded': True,
+            'instrument': self.instruments[symbol]['url'],
+            'updated_at': self.now(),
+        }
+
+    def fundamentals(self, symbol):
+        if symbol not in self.instruments:
+            return None
+        price = self.prices[symbol]
+        return {
+            'symbol': symbol,
+            'open': '{:.4f}'.format(price),
+            'high': '{:.4f}'.format(price * 1.01),
+            'low': '{:.4f}'.format(price * 0.99),
+            'high_52_weeks': '{:.4f}'.format(price * random.Random(symbol).uniform(1.0, 1.3)),
+            'low_52_weeks': '{:.4f}'.format(price * 0.6),
+            'market_cap': '{:.2f}'.format(price * 1e8),
+            'pe_ratio': '20.000000',
+            'instrument': self.instruments[symbol]['url'],
+        }
+
+    def historicals(self, symbol, interval, span):
+        if symbol not in self.instruments:
+            return None
+        rng = random.Random(symbol)
+        end = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        price = self.prices[symbol]
+        bars = list()
+        for i in range(self.bars, 0, -1):
+            close = price * (1 + rng.uniform(-0.03, 0.03))
+            bars.append({
+                'begins_at': (end - datetime.timedelta(days=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'open_price': '{:.4f}'.format(price),
+                'close_price': '{:.4f}'.format(close),
+                'high_price': '{:.4f}'.format(max(price, close) * 1.01),
+                'low_price': '{:.4f}'.format(min(price, close) * 0.99),
+                'volume': rng.randint(10000, 1000000),
+                'session': 'reg',
+                'interpolated': False,
+            })
+            price = close
+        return {'symbol': symbol, 'interval': interval, 'span': span, 'historicals': bars}
+
+    def news(self, symbol):
+        return [{
+            'uuid': '{}-{}'.format(symbol, i),
+            'url': 'https://news.example.com/{}/{}'.format(symbol, i),
+            'title': '{} story {}'.format(symbol, i),
+            'published_at': (datetime.datetime(2019, 1, 1) - datetime.timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        } for i in range(50)]
+
+    def dividends(self):
+        # Newest record date first, one dividend per position a week apart
+        today = datetime.date.today()
+        dividends = list()
+        for i, x in enumerate(self.positions):
+            record_date = today - datetime.timedelta(days=7 * i)
+            dividends.append({
+                'id': 'div-{}'.format(i),
+                'url': '{}/dividends/div-{}/'.format(self.base_url, i),
+                'instrument': x['instrument'],
+                'amount': '1.00',
+                'record_date': record_date.isoformat(),
+                'payable_date': (record_date + datetime.timedelta(days=14)).isoformat(),
+                'state': 'paid',
+            })
+        return dividends
+
+    def place_order(self, form):
+        symbol = form['symbol'][0].upper()
+        with self.lock:
+            order = self._order(symbol, form['side'][0], 'confirmed', form['quantity'][0],
+                                form.get('price', [self.prices[symbol]])[0], self.now())
+            self.orders.append(order)
+        return order
+
+    def cancel_order(self, order_id):
+        with self.lock:
+            for order in self.orders:
+                if order['id'] == order_id:
+                    order['state'] = 'cancelled'
+                    order['cancel'] = None
+                    order['updated_at'] = self.now()
+                    return {}
+        return None
+
+    def screener_page(self, start):
+        """Finviz Overview screener HTML for the 20 rows starting at `start` (1 based)"""
+
+        total = self.screener_results
+        if start > total:
+            # Finviz serves the last page for offsets past the end
+            start = max(1, ((total - 1) // 20) * 20 + 1)
+        rows = list()
+        for i in range(start, min(start + 20, total + 1)):
+            symbol = 'F{:05d}'.format(i)
+            price = 10.0 + i % 490
+            cells = [str(i), symbol, symbol + ' Inc', 'Technology', 'Software', 'USA',
+                     '{:.2f}B'.format(price / 10), '20.00', '{:.2f}'.format(price), '1.23%', '1,234,567']
+            tds = ''.join(
+                '<td class="screener-body-table-nw"><a href="quote.ashx?t={}" class="{}">{}</a></td>'.format(
+                    symbol, 'screener-link-primary' if n == 1 else 'screener-link', c)
+                for n, c in enumerate(cells))
+            rows.append('<tr valign="top" class="table-light-row-cp">{}</tr>'.format(tds))
+
+        filler = '<div class="filler">{}</div>'.format('<span>layout</span>' * 500)
+        return ('<html><head><title>Screener</title></head><body>{}'
+                '<table><tr><td class="count-text"><b>Total: </b>{} #{}</td></tr></table>'
+                '<table class="table-light">{}</table>{}</body></html>').format(
+                    filler, total, start, ''.join(rows), filler)
+
+    def zacks_page(self, symbol):
+        rank = int(self.prices.get(symbol, 3)) % 5 + 1
+        filler = '<div class="filler">{}</div>'.format('<p>layout</p>' * 2000)
+        return ('<html><body>{}<div class="zr_rankbox"><p class="rank_view">\n'
+                '{}-Rank</p></div>{}</body></html>').format(filler, rank, filler)
+
+
+class Fake_Robinhood:
+    """Threaded HTTP server serving Fake_Data
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, **data_options):
+        """Fake_Robinhood initialization
+
+        Parameters
+        ----------
+        host : str, optional
+            Interface to listen on (the default is '127.0.0.1')
+        port : int, optional
+            Port to listen on (the default is 0, which picks a free port)
+        latency : float, optional
+            Seconds added to every response (the default is 0.0)
+        **data_options
+            Data sizes passed to Fake_Data: symbols, positions, orders, bars, screener_results, page_size, seed
+        """
+
+        self.latency = latency
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = 'http://{}:{}'.format(*self.server.server_address[:2])
+        self.data = Fake_Data(self.url, **data_options)
+        self.thread = None
+
+    def start(self):
+        """Serves requests on a background thread.
+
+        """
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server.
+
+        """
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._respond(self, 'GET')
+
+            def do_POST(self):
+                fake._respond(self, 'POST')
+
+        return Handler
+
+    def _respond(self, handler, method):
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+        form = dict()
+        length = int(handler.headers.get('Content-Length') or 0)
+        if length:
+            form = parse_qs(handler.rfile.read(length).decode())
+
+        status, body, content_type = self.route(method, parsed.path, query, form)
+
+        if parsed.path != '/__stats__/':
+            with self.data.lock:
+                self.data.requests[self.endpoint_name(parsed.path)] += 1
+
+        if not isinstance(body, bytes):
+            body = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def endpoint_name(self, path):
+        """Logical endpoint name for request counting"""
+
+        if path.startswith('/quotes/historicals'):
+            return 'historicals'
+        if path.startswith('/midlands/news'):
+            return 'news'
+        if path.startswith('/api-token-auth'):
+            return 'login'
+        if path.startswith('/api-token-logout'):
+            return 'logout'
+        if re.match(r'^/orders/[^/]+/cancel/', path):
+            return 'cancel_order'
+        if path.startswith('/stock/quote'):
+            return 'zacks'
+        if path.startswith('/screener.ashx'):
+            return 'finviz'
+        return path.strip('/').split('/')[0] or 'root'
+
+    def page(self, items, query, path):
+        """One page of a paginated result with a `next` link"""
+
+        offset = int(query.get('cursor', ['0'])[0])
+        size = int(query.get('page_size', [self.data.page_size])[0])
+        next_url = None
+        if offset + size < len(items):
+            params = {k: v[0] for k, v in query.items()}
+            params['cursor'] = offset + size
+            next_url = '{}{}?{}'.format(self.url, path, urlencode(params))
+        return {'results': items[offset:offset + size], 'next': next_url, 'previous': None}
+
+    def route(self, method, path, query, form):
+        """Builds the (status, body, content type) for a request"""
+
+        data = self.data
+        symbols = query.get('symbols', [''])[0].upper().split(',') if 'symbols' in query else None
+        json_type = 'application/json'
+
+        if path == '/__stats__/':
+            with data.lock:
+                counts = dict(data.requests)
+                if method == 'POST':
+                    data.requests.clear()
+            return 200, counts, json_type
+
+        if method == 'POST':
+            if path == '/api-token-auth/':
+                return 200, {'token': 'fake-token'}, json_type
+            if path == '/api-token-logout/':
+                return 200, {}, json_type
+            if path == '/orders/':
+                return 201, data.place_order(form), json_type
+            match = re.match(r'^/orders/([^/]+)/cancel/$', path)
+            if match:
+                res = data.cancel_order(match.group(1))
+                return (200, res, json_type) if res is not None else (404, {}, json_type)
+            return 404, {'detail': 'Not found.'}, json_type
+
+        if path == '/accounts/':
+            return 200, {'results': [data.account], 'next': None}, json_type
+        if path == '/positions/':
+            return 200, self.page(data.positions, query, path), json_type
+        if path == '/orders/':
+            orders = data.orders
+            since = query.get('updated_at[gte]')
+            if since:
+                orders = [x for x in orders if x['updated_at'] >= since[0]]
+            return 200, self.page(orders, query, path), json_type
+        match = re.match(r'^/orders/([^/]+)/$', path)
+        if match:
+            for order in data.orders:
+                if order['id'] == match.group(1):
+                    return 200, order, json_type
+            return 404, {'detail': 'Not found.'}, json_type
+        if path == '/instruments/':
+            items = list(data.instruments.values())
+            if 'symbol' in query:
+                symbol = query['symbol'][0].upper()
+                items = [data.instruments[symbol]] if symbol in data.instruments else []
+            return 200, self.page(items, query, path), json_type
+        match = re.match(r'^/instruments/([^/]+)/$', path)
+        if match and match.group(1).upper() in data.instruments:
+            return 200, data.instruments[match.group(1).upper()], json_type
+        if path == '/quotes/historicals/':
+            return 200, {'results': [data.historicals(s, query.get('interval', ['day'])[0],
+                                                      query.get('span', ['year'])[0]) for s in symbols]}, json_type
+        if path == '/quotes/':
+            return 200, {'results': [data.quote(s) for s in symbols]}, json_type
+        match = re.match(r'^/quotes/([^/]+)/$', path)
+        if match and data.quote(match.group(1).upper()):
+            return 200, data.quote(match.group(1).upper()), json_type
+        if path == '/fundamentals/':
+            return 200, {'results': [data.fundamentals(s) for s in symbols]}, json_type
+        match = re.match(r'^/fundamentals/([^/]+)/$', path)
+        if match and data.fundamentals(match.group(1).upper()):
+            return 200, data.fundamentals(match.group(1).upper()), json_type
+        if path == '/dividends/':
+            return 200, self.page(data.dividends(), query, path), json_type
+        match = re.match(r'^/midlands/news/([^/]+)/$', path)
+        if match:
+            return 200, self.page(data.news(match.group(1).upper()), query, path), json_type
+        if path == '/screener.ashx':
+            return 200, data.screener_page(int(query.get('r', ['1'])[0])), 'text/html'
+        match = re.match(r'^/stock/quote/([^/]+)$', path)
+        if match:
+            return 200, data.zacks_page(match.group(1).upper()), 'text/html'
+
+        return 404, {'detail': 'Not found.'}, json_type
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Robinhood API.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--positions', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=1000)
+    args = parser.parse_args()
+
+    server = Fake_Robinhood(port=args.port, latency=args.latency,
+                            positions=args.positions, orders=args.orders)
+    print('Serving on {}'.format(server.url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
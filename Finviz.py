@@ -1,7 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
+import re
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import Html_Extract
+import Metrics
+import Rate_Limiter
+import Transport
 
 
 class Finviz():
@@ -10,12 +15,26 @@ class Finviz():
     username = None
     password = None
     url = None
+    rows_per_page = 20
 
-    def __init__(self):
-        """Create session for requests
+    def __init__(self, max_workers=4, parser=None, rate=None):
+        """Create session for requests on the shared transport
 
+        Parameters
+        ----------
+        max_workers : int, optional
+            Number of screener pages fetched at the same time (the default is 4)
+        parser : str, optional
+            HTML extraction backend, see Html_Extract (the default is None, which uses Html_Extract.default_backend)
+        rate : float, optional
+            Requests per second allowed to finviz.com, shared by the whole process. Rate_Limiter.suggested_budgets has 2. (the default is None, which keeps the configured budget, unlimited unless set)
         """
-        self.session = requests.session()
+        if rate is not None:
+            Rate_Limiter.limiter.configure('finviz.com', rate)
+        self.max_workers = max_workers
+        self.parser = Html_Extract.get_backend(parser)
+        self.session = Transport.new_session()
+        Metrics.registry.register({'finviz_screener': 'https://finviz.com/screener.ashx'})
 
     def get_stocks(self, url):
         """Get stocks from a screen URL. 
@@ -34,22 +53,252 @@ class Finviz():
         self.url = url
         assert(self.url != None), "URL must be specified to get Finviz data."
         assert('v=111' in self.url), "URL must be from the 'Overview' screener page."
-        
-        symbol_list = list()
-
-        while True: 
-            n_url = url + '&r={}'.format(len(symbol_list)+1)
-            res = self.session.get(n_url)
-            res.raise_for_status()
-            c = res.content
-
-            soup = BeautifulSoup(c, "html.parser")
-            _t = 1 # Flag to indicate first stock in the query
-            for ticker in soup.find_all(name='a', class_='screener-link-primary', text=True):
-                if _t == 1:
-                    _t = 2
-                    if ticker.text in symbol_list:
-                        return symbol_list
-                symbol_list.append(ticker.text)
-
-        return symbol_list
\ No newline at end of file
+
+        return self._collect(url, self._parse_tickers, lambda x: x)
+
+    def get_screen(self, url):
+        """Get the whole Overview table of a screen URL as columns
+
+        Each page is parsed once and every column of the Overview table is
+        kept, so the screen's market data needs no further requests.
+
+        Parameters
+        ----------
+        url : str
+            URL for the screen, from the 'Overview' (v=111) screener page
+
+        Returns
+        -------
+        dict
+            Arrays of equal length in screen order, see overview_to_arrays. Requires numpy.
+        """
+
+        self.url = url
+        assert(self.url != None), "URL must be specified to get Finviz data."
+        assert('v=111' in self.url), "URL must be from the 'Overview' screener page."
+
+        rows = self._collect(url, self._parse_rows, lambda x: x[1])
+        return overview_to_arrays(rows)
+
+    def _collect(self, url, parse, key):
+        """Parses every page of a screen, dropping repeated items
+
+        Parameters
+        ----------
+        url : str
+            URL for the screen
+        parse : callable
+            Returns the items on a page given its HTML
+        key : callable
+            Returns an item's ticker symbol
+
+        Returns
+        -------
+        list
+            Items in screen order
+        """
+
+        # The first page tells how many results there are, the rest can then
+        # be requested at the same time
+        first = self._get_page(url, 1)
+        total = self._total_results(first)
+        pages = [first]
+
+        if total is None:
+            return self._collect_serial(url, first, parse, key)
+
+        offsets = range(self.rows_per_page + 1, total + 1, self.rows_per_page)
+        if offsets:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages.extend(executor.map(lambda r: self._get_page(url, r), offsets))
+
+        items = list()
+        seen = set()
+        for page in pages:
+            for item in parse(page):
+                if key(item) not in seen:
+                    seen.add(key(item))
+                    items.append(item)
+
+        return items
+
+    def _get_page(self, url, start):
+        """Requests one screener page
+
+        Parameters
+        ----------
+        url : str
+            URL for the screen
+        start : int
+            1 based row the page starts at
+
+        Returns
+        -------
+        bytes
+            Page HTML
+        """
+
+        res = self.session.get(url + '&r={}'.format(start))
+        res.raise_for_status()
+        return res.content
+
+    def _total_results(self, content):
+        """Total number of results reported on a screener page
+
+        Parameters
+        ----------
+        content : bytes
+            Page HTML
+
+        Returns
+        -------
+        int
+            Number of results, or None if it could not be found
+        """
+
+        match = re.search(rb'Total:\s*</b>\s*(\d+)', content)
+        return int(match.group(1)) if match else None
+
+    def _parse_tickers(self, content):
+        """Ticker symbols on a screener page, in page order
+
+        Parameters
+        ----------
+        content : bytes
+            Page HTML
+
+        Returns
+        -------
+        list
+            Ticker symbols
+        """
+
+        return [x for x in self.parser.texts(content, 'a', 'screener-link-primary') if x]
+
+    def _parse_rows(self, content):
+        """Overview table rows on a screener page, in page order
+
+        Parameters
+        ----------
+        content : bytes
+            Page HTML
+
+        Returns
+        -------
+        list
+            Lists of stripped cell texts, one per column of overview_columns
+        """
+
+        rows = self.parser.rows(content, 'a', 'screener-link-primary')
+        return [[x.strip() for x in row] for row in rows if len(row) >= len(overview_columns)]
+
+    def _collect_serial(self, url, first, parse, key):
+        """Walks the screen one page at a time until a page repeats
+
+        Used when the total number of results can not be read from the page.
+
+        Parameters
+        ----------
+        url : str
+            URL for the screen
+        first : bytes
+            HTML of the first page
+        parse : callable
+            Returns the items on a page given its HTML
+        key : callable
+            Returns an item's ticker symbol
+
+        Returns
+        -------
+        list
+            Items in screen order
+        """
+
+        items = list()
+        seen = set()
+        page = first
+
+        while True:
+            found = parse(page)
+            # Finviz returns the last page again when asked past the end
+            if not found or key(found[0]) in seen:
+                return items
+            for item in found:
+                if key(item) not in seen:
+                    seen.add(key(item))
+                    items.append(item)
+            page = self._get_page(url, len(items) + 1)
+
+
+# Overview (v=111) table columns: (name, type)
+overview_columns = (
+    ('no', 'int'),
+    ('ticker', 'str'),
+    ('company', 'str'),
+    ('sector', 'str'),
+    ('industry', 'str'),
+    ('country', 'str'),
+    ('market_cap', 'number'),
+    ('pe', 'number'),
+    ('price', 'number'),
+    ('change', 'percent'),
+    ('volume', 'number'),
+)
+
+_suffixes = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+
+
+def _number(text):
+    """Parses a Finviz number such as '1,234', '12.5B' or '-1.23%', NaN if missing"""
+
+    text = text.replace(',', '').rstrip('%')
+    if not text or text == '-':
+        return float('nan')
+    scale = _suffixes.get(text[-1])
+    if scale:
+        text = text[:-1]
+    try:
+        return float(text) * (scale or 1)
+    except ValueError:
+        return float('nan')
+
+
+def overview_to_arrays(rows):
+    """Converts Overview table rows into columnar arrays
+
+    Parameters
+    ----------
+    rows : list of list
+        Cell texts in overview_columns order
+
+    Returns
+    -------
+    dict
+        Arrays of equal length:
+            'no'            int64, position in the screen
+            'ticker'        str
+            'company'       str
+            'sector'        str
+            'industry'      str
+            'country'       str
+            'market_cap'    float64, dollars
+            'pe'            float64
+            'price'         float64
+            'change'        float64, fraction, e.g. 0.0123 for 1.23%
+            'volume'        float64, shares
+        Missing numbers ('-' on Finviz) are NaN. Requires numpy.
+    """
+
+    import numpy as np
+
+    arrays = dict()
+    for i, (name, kind) in enumerate(overview_columns):
+        column = [row[i] for row in rows]
+        if kind == 'str':
+            arrays[name] = np.array(column, dtype=str)
+        elif kind == 'int':
+            arrays[name] = np.array([int(x) for x in column], dtype=np.int64)
+        else:
+            values = np.array([_number(x) for x in column], dtype=np.float64)
+            arrays[name] = values / 100 if kind == 'percent' else values
+    return arrays
@@ -0,0 +1,251 @@
+import os
+
+import numpy as np
+
+from Historicals import arrays_to_records, bar_dtype, historicals_to_arrays
+
+
+class Historical_Cache:
+    """On-disk cache of historical bars per symbol and interval
+
+    Bars are stored as `.npy` files of `Historicals.bar_dtype` records and
+    read back memory-mapped, so columns like cache.get('AAPL')['close'] are
+    views of the file with no copying or parsing. Next to each file the
+    longest span fetched in full is recorded. Updates only ask Robinhood for
+    the shortest span that covers the bars since the last cached one, unless
+    a longer span than that is asked for, which is then backfilled once.
+    """
+
+    # Spans accepted by the `historicals` endpoint for each interval, shortest first
+    spans = {
+        '5minute': ['day', 'week'],
+        '10minute': ['day', 'week'],
+        'hour': ['week', 'month', '3month'],
+        'day': ['week', 'month', '3month', 'year', '5year'],
+        'week': ['year', '5year'],
+    }
+
+    span_lengths = {
+        'day': np.timedelta64(1, 'D'),
+        'week': np.timedelta64(7, 'D'),
+        'month': np.timedelta64(31, 'D'),
+        '3month': np.timedelta64(92, 'D'),
+        'year': np.timedelta64(366, 'D'),
+        '5year': np.timedelta64(5 * 366, 'D'),
+    }
+
+    def __init__(self, trader, directory):
+        """Historical_Cache initialization
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Robinhood object used to fetch missing bars
+        directory : str
+            Directory the cache files are kept in. Created if needed.
+        """
+
+        self.trader = trader
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, symbol, interval):
+        """Cache file for a symbol and interval
+
+        Returns
+        -------
+        str
+            Path of the `.npy` file
+        """
+
+        return os.path.join(self.directory, '{}_{}.npy'.format(symbol.upper(), interval))
+
+    def read(self, symbol, interval='day'):
+        """Memory-maps the cached bars for a symbol
+
+        Returns
+        -------
+        numpy.ndarray
+            Read-only structured array of cached bars, empty if nothing is cached
+        """
+
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=bar_dtype)
+        return np.load(path, mmap_mode='r')
+
+    def write(self, symbol, interval, records):
+        """Replaces the cached bars for a symbol
+
+        Written to a temporary file first and then moved into place, so
+        readers never see a partial file.
+        """
+
+        path = self.path(symbol, interval)
+        tmp = path + '.tmp.npy'
+        np.save(tmp, np.ascontiguousarray(records, dtype=bar_dtype))
+        os.replace(tmp, path)
+
+    def span_path(self, symbol, interval):
+        """File recording the longest span fetched in full for a symbol and interval
+
+        Returns
+        -------
+        str
+            Path of the text file
+        """
+
+        return os.path.join(self.directory, '{}_{}.span'.format(symbol.upper(), interval))
+
+    def filled_span(self, symbol, interval='day'):
+        """Longest span fetched in full for a symbol
+
+        Returns
+        -------
+        str
+            Span name, or None if none is recorded
+        """
+
+        path = self.span_path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip() or None
+
+    def _covers(self, filled, span):
+        if filled is None:
+            return False
+        if filled == span:
+            return True
+        return self.span_lengths.get(filled, 0) >= self.span_lengths.get(span, 0) > 0
+
+    def record_span(self, symbol, interval, span):
+        """Records that a span was fetched in full, if it is longer than the recorded one
+
+        """
+
+        if self._covers(self.filled_span(symbol, interval), span):
+            return
+        path = self.span_path(symbol, interval)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(span)
+        os.replace(tmp, path)
+
+    def update_span(self, cached, interval, span, filled=None):
+        """Shortest span that covers the bars missing from the cache
+
+        The whole span is requested when no span at least as long was fetched
+        in full before, e.g. a cache filled with 'year' asked for '5year'.
+
+        Parameters
+        ----------
+        cached : numpy.ndarray
+            Cached bars
+        interval : str
+            Bar interval
+        span : str
+            Span wanted by the caller
+        filled : str, optional
+            Longest span fetched in full, from filled_span (the default is None, which requests the whole span)
+
+        Returns
+        -------
+        str
+            Span to request
+        """
+
+        if len(cached) == 0 or not self._covers(filled, span):
+            return span
+
+        gap = np.datetime64('now', 's') - cached['begins_at'][-1]
+        for option in self.spans.get(interval, [span]):
+            if self.span_lengths[option] > gap:
+                return option
+        return span
+
+    def merge(self, symbol, interval, arrays, span=None):
+        """Merges fetched bars into the cache
+
+        Fetched bars replace any cached bars from their first timestamp on,
+        so the last cached bar is refreshed if it was still in progress.
+
+        Parameters
+        ----------
+        symbol : str
+            Stock ticker symbol
+        interval : str
+            Bar interval
+        arrays : dict
+            Arrays from Historicals.bars_to_arrays
+        span : str, optional
+            Span the bars were fetched with, recorded by record_span (the default is None)
+
+        Returns
+        -------
+        int
+            Number of bars newer than the previous last cached bar
+        """
+
+        cached = self.read(symbol, interval)
+        fetched = arrays_to_records(arrays)
+        if span:
+            self.record_span(symbol, interval, span)
+        if len(fetched) == 0:
+            return 0
+        if len(cached) == 0:
+            self.write(symbol, interval, fetched)
+            return len(fetched)
+
+        last = cached['begins_at'][-1]
+        added = int(np.count_nonzero(fetched['begins_at'] > last))
+        keep = np.searchsorted(cached['begins_at'], fetched['begins_at'][0])
+        self.write(symbol, interval, np.concatenate([cached[:keep], fetched]))
+        return added
+
+    def update(self, symbol, interval='day', span='year'):
+        """Fetches and stores bars newer than the last cached one
+
+        Returns
+        -------
+        int
+            Number of bars added
+        """
+
+        symbol = symbol.upper()
+        cached = self.read(symbol, interval)
+        fetch_span = self.update_span(cached, interval, span, filled=self.filled_span(symbol, interval))
+        data = self.trader.get_historical_quotes(symbol, interval=interval, span=fetch_span)
+        arrays = historicals_to_arrays(data).get(symbol)
+        if arrays is None:
+            return 0
+        return self.merge(symbol, interval, arrays, span=fetch_span)
+
+    def get(self, symbol, interval='day', span='year', update=True):
+        """Cached bars for a symbol, updated first if asked
+
+        Parameters
+        ----------
+        symbol : str
+            Stock ticker symbol
+        interval : str, optional
+            Bar interval (the default is 'day')
+        span : str, optional
+            Length of history to return (the default is 'year')
+        update : bool, optional
+            Fetch new bars before reading (the default is True)
+
+        Returns
+        -------
+        numpy.ndarray
+            Memory-mapped structured array of the bars within the span
+        """
+
+        if update:
+            self.update(symbol, interval=interval, span=span)
+
+        bars = self.read(symbol, interval)
+        if len(bars) and span in self.span_lengths:
+            start = np.datetime64('now', 's') - self.span_lengths[span]
+            bars = bars[np.searchsorted(bars['begins_at'], start):]
+        return bars
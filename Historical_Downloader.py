@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Historicals import historicals_to_arrays
+
+
+class Historical_Downloader:
+    """Bulk historicals download for a universe of symbols
+
+    Symbols are fetched with the multi-symbol form of the `historicals`
+    endpoint, several requests at a time. Progress is reported after every
+    request and completed symbols can be recorded in a checkpoint file so an
+    interrupted run picks up where it stopped. The checkpoint is removed when
+    a run completes, so the next run downloads everything again.
+    """
+
+    def __init__(self, trader, cache=None, checkpoint_path=None, max_workers=4, batch_size=None, progress=None):
+        """Historical_Downloader initialization
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Robinhood object used for the requests
+        cache : Historical_Cache, optional
+            Cache to merge downloaded bars into. Each symbol then only needs the bars since its last cached one. (the default is None, which returns the bars)
+        checkpoint_path : str, optional
+            JSON file listing completed symbols, used to resume an interrupted run (the default is None)
+        max_workers : int, optional
+            Number of requests in flight at once (the default is 4)
+        batch_size : int, optional
+            Symbols per request (the default is None, which uses trader.historicals_batch_size)
+        progress : callable, optional
+            Called as progress(done, total) after each request (the default is None, which logs progress)
+        """
+
+        self.trader = trader
+        self.cache = cache
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.batch_size = batch_size or trader.historicals_batch_size
+        self.progress = progress or self._log_progress
+        self.lock = threading.Lock()
+
+    def _log_progress(self, done, total):
+        logging.info('Historicals: {}/{} symbols downloaded.'.format(done, total))
+
+    def load_checkpoint(self, interval, span):
+        """Symbols completed by a previous run with the same interval and span
+
+        Returns
+        -------
+        set
+            Upper case symbols
+        """
+
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+
+        with open(self.checkpoint_path) as f:
+            data = json.load(f)
+        if data.get('interval') != interval or data.get('span') != span:
+            return set()
+        return set(data['done'])
+
+    def save_checkpoint(self, interval, span, done):
+        """Records the completed symbols
+
+        """
+
+        if not self.checkpoint_path:
+            return
+
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'interval': interval, 'span': span, 'done': sorted(done)}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        """Deletes the checkpoint so the next run starts from the beginning
+
+        """
+
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def batches(self, symbols, interval, span):
+        """Groups symbols into requests
+
+        With a cache, symbols needing the same update span share requests.
+
+        Yields
+        ------
+        tuple
+            (list of symbols, span to request)
+        """
+
+        groups = dict()
+        for symbol in symbols:
+            if self.cache:
+                cached = self.cache.read(symbol, interval)
+                filled = self.cache.filled_span(symbol, interval)
+                groups.setdefault(self.cache.update_span(cached, interval, span, filled=filled), []).append(symbol)
+            else:
+                groups.setdefault(span, []).append(symbol)
+
+        for group_span, group in groups.items():
+            for chunk in self.trader._chunks(group, self.batch_size):
+                yield chunk, group_span
+
+    def _fetch(self, symbols, interval, span):
+        """Fetches one request's symbols
+
+        Returns
+        -------
+        dict
+            Arrays from Historicals.bars_to_arrays keyed by symbol
+        """
+
+        data = self.trader.get_historical_quotes_many(symbols, interval=interval, span=span)
+        return historicals_to_arrays(data)
+
+    def download(self, symbols, interval='day', span='year'):
+        """Downloads historicals for every symbol
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock ticker symbols
+        interval : str, optional
+            Resolution of the data (the default is 'day')
+        span : str, optional
+            Length of the data (the default is 'year')
+
+        Returns
+        -------
+        dict
+            Keyed by symbol: number of bars added to the cache if there is one,
+            otherwise the arrays from Historicals.bars_to_arrays. Symbols
+            completed by an earlier, interrupted run are not included. The
+            checkpoint is deleted once every symbol has been downloaded.
+        """
+
+        symbols = self.trader._unique_symbols(symbols)
+        done = self.load_checkpoint(interval, span)
+        todo = [x for x in symbols if x not in done]
+        universe = set(symbols)
+        total = len(symbols)
+        results = dict()
+
+        self.progress(total - len(todo), total)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch, chunk, interval, chunk_span): (chunk, chunk_span)
+                       for chunk, chunk_span in self.batches(todo, interval, span)}
+
+            for future in as_completed(futures):
+                chunk, chunk_span = futures[future]
+                try:
+                    arrays = future.result()
+                except Exception:
+                    logging.exception('Failed to download historicals for {}.'.format(','.join(chunk)))
+                    continue
+
+                for symbol, bars in arrays.items():
+                    if self.cache:
+                        results[symbol] = self.cache.merge(symbol, interval, bars, span=chunk_span)
+                    else:
+                        results[symbol] = bars
+
+                with self.lock:
+                    done.update(chunk)
+                    self.save_checkpoint(interval, span, done)
+                self.progress(len(done & universe), total)
+
+        if universe <= done:
+            self.clear_checkpoint()
+
+        return results
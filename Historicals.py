@@ -0,0 +1,117 @@
+"""
+    Columnar NumPy conversion of Robinhood `historicals` data.
+
+    Prices arrive as strings and timestamps as ISO text. Converting whole
+    columns with NumPy's astype parses them in C instead of calling float()
+    and strptime() once per value.
+"""
+
+
+import numpy as np
+
+
+price_fields = {
+    'open': 'open_price',
+    'high': 'high_price',
+    'low': 'low_price',
+    'close': 'close_price',
+}
+
+
+def bars_to_arrays(bars):
+    """Converts a list of historical bars into columnar arrays
+
+    Parameters
+    ----------
+    bars : list of dict
+        Items from a `historicals` result's 'historicals' list
+
+    Returns
+    -------
+    dict
+        Arrays of equal length, sorted by time:
+            'begins_at'     datetime64[s]
+            'open'          float64
+            'high'          float64
+            'low'           float64
+            'close'         float64
+            'volume'        int64
+            'regular'       bool, True for regular session bars
+            'interpolated'  bool
+    """
+
+    n = len(bars)
+    if n == 0:
+        arrays = {'begins_at': np.empty(0, dtype='datetime64[s]')}
+        for name in price_fields:
+            arrays[name] = np.empty(0, dtype=np.float64)
+        arrays['volume'] = np.empty(0, dtype=np.int64)
+        arrays['regular'] = np.empty(0, dtype=bool)
+        arrays['interpolated'] = np.empty(0, dtype=bool)
+        return arrays
+
+    # ISO text without the trailing 'Z', which datetime64 does not accept
+    stamps = np.array([x['begins_at'] for x in bars])
+    stamps = np.char.rstrip(stamps, 'Z').astype('datetime64[s]')
+    order = np.argsort(stamps, kind='stable')
+
+    arrays = {'begins_at': stamps[order]}
+    for name, field in price_fields.items():
+        column = np.array([x[field] for x in bars])
+        arrays[name] = column.astype(np.float64)[order]
+
+    arrays['volume'] = np.array([x['volume'] for x in bars]).astype(np.int64)[order]
+    arrays['regular'] = (np.array([x['session'] for x in bars]) == 'reg')[order]
+    arrays['interpolated'] = np.array([bool(x['interpolated']) for x in bars])[order]
+
+    return arrays
+
+
+def historicals_to_arrays(data):
+    """Converts a `historicals` endpoint payload into columnar arrays per symbol
+
+    Parameters
+    ----------
+    data : dict
+        Payload returned by Robinhood.get_historical_quotes
+
+    Returns
+    -------
+    dict
+        Arrays from bars_to_arrays keyed by upper case symbol
+    """
+
+    return {x['symbol'].upper(): bars_to_arrays(x.get('historicals') or [])
+            for x in data.get('results') or [] if x}
+
+
+bar_dtype = np.dtype([
+    ('begins_at', 'datetime64[s]'),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.int64),
+    ('regular', bool),
+    ('interpolated', bool),
+])
+
+
+def arrays_to_records(arrays):
+    """Packs columnar arrays into one structured array of `bar_dtype`
+
+    Parameters
+    ----------
+    arrays : dict
+        Arrays from bars_to_arrays
+
+    Returns
+    -------
+    numpy.ndarray
+        Structured array with one record per bar
+    """
+
+    records = np.empty(len(arrays['begins_at']), dtype=bar_dtype)
+    for name in bar_dtype.names:
+        records[name] = arrays[name]
+    return records
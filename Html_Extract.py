@@ -0,0 +1,304 @@
+"""
+    Targeted HTML extraction for the Finviz and Zacks scrapers.
+
+    The scrapers only need a few elements from each page, so building a full
+    DOM is wasted work. Every backend answers the same three questions:
+
+        texts(content, tag, cls)        text of every <tag class="cls"> element
+        first_html(content, tag, cls)   outer HTML of the first such element
+        rows(content, tag, cls)         cell texts of every table row holding
+                                        a <tag class="cls"> element
+
+    Backends
+    --------
+    'stream'    Default. Jumps to the first occurrence of the class name with
+                a C-level string search and runs a tokenizer from there,
+                stopping as soon as the target is complete.
+    'lxml'      libxml2 C parser. Used only if lxml is installed.
+    'bs4'       BeautifulSoup with "html.parser", the original behaviour.
+"""
+
+
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+default_backend = 'stream'
+
+
+def _decode(content):
+    if isinstance(content, bytes):
+        return content.decode('utf-8', errors='replace')
+    return content
+
+
+def _has_class(attrs, cls):
+    for name, value in attrs:
+        if name == 'class' and value and cls in value.split():
+            return True
+    return False
+
+
+class _Found(Exception):
+    """Raised inside the tokenizer to stop once the target is complete"""
+
+
+class _Target_Parser(HTMLParser):
+    """Tokenizer collecting <tag class="cls"> elements
+
+    """
+
+    def __init__(self, tag, cls, first_only=False):
+        super().__init__(convert_charrefs=True)
+        self.tag = tag
+        self.cls = cls
+        self.first_only = first_only
+        self.depth = 0
+        self.texts = list()
+        self.current = None
+        self.start = None
+        self.end = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            if tag == self.tag:
+                self.depth += 1
+        elif tag == self.tag and _has_class(attrs, self.cls):
+            self.depth = 1
+            self.current = list()
+            if self.start is None:
+                self.start = self.getpos()
+
+    def handle_endtag(self, tag):
+        if self.depth and tag == self.tag:
+            self.depth -= 1
+            if self.depth == 0:
+                self.texts.append(''.join(self.current))
+                self.current = None
+                if self.first_only:
+                    self.end = self.getpos()
+                    raise _Found()
+
+    def handle_data(self, data):
+        if self.depth:
+            self.current.append(data)
+
+
+class _Row_Parser(HTMLParser):
+    """Tokenizer collecting the cells of rows holding a <tag class="cls"> element
+
+    Rows are kept on a stack so cells of nested tables go to the innermost row.
+    """
+
+    def __init__(self, tag, cls):
+        super().__init__(convert_charrefs=True)
+        self.tag = tag
+        self.cls = cls
+        self.stack = list()
+        self.rows = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.stack.append({'cells': list(), 'cell': None, 'marked': False})
+        elif not self.stack:
+            return
+        elif tag == 'td':
+            row = self.stack[-1]
+            row['cell'] = list()
+            row['cells'].append(row['cell'])
+        elif tag == self.tag and _has_class(attrs, self.cls):
+            self.stack[-1]['marked'] = True
+
+    def handle_endtag(self, tag):
+        if not self.stack:
+            return
+        if tag == 'td':
+            self.stack[-1]['cell'] = None
+        elif tag == 'tr':
+            row = self.stack.pop()
+            if row['marked']:
+                self.rows.append([''.join(x) for x in row['cells']])
+
+    def handle_data(self, data):
+        if self.stack and self.stack[-1]['cell'] is not None:
+            self.stack[-1]['cell'].append(data)
+
+
+class Stream_Backend:
+    """Early-stopping tokenizer backend
+
+    """
+
+    name = 'stream'
+
+    def _window(self, text, tag, cls, first_only):
+        """Slice of the page that can contain the targets
+
+        Starts at the tag holding the first occurrence of the class name and,
+        for all matches, ends after the closing tag following the last one.
+        """
+
+        first = text.find(cls)
+        if first < 0:
+            return None
+        start = max(text.rfind('<', 0, first), 0)
+        if first_only:
+            return text[start:]
+        end = text.find('</' + tag, text.rfind(cls))
+        end = text.find('>', end) + 1 if end >= 0 else 0
+        return text[start:end or len(text)]
+
+    def _parse(self, text, tag, cls, first_only):
+        parser = _Target_Parser(tag, cls, first_only=first_only)
+        try:
+            parser.feed(text)
+            parser.close()
+        except _Found:
+            pass
+        return parser
+
+    def texts(self, content, tag, cls):
+        window = self._window(_decode(content), tag, cls, first_only=False)
+        if window is None:
+            return []
+        return self._parse(window, tag, cls, first_only=False).texts
+
+    def first_html(self, content, tag, cls):
+        window = self._window(_decode(content), tag, cls, first_only=True)
+        if window is None:
+            return None
+
+        parser = self._parse(window, tag, cls, first_only=True)
+        if parser.end is None:
+            return None
+
+        # getpos() is (line, column) with lines split on '\n' only; convert
+        # both ends to offsets in the window
+        offsets = [0]
+        for line in window.split('\n'):
+            offsets.append(offsets[-1] + len(line) + 1)
+        start = offsets[parser.start[0] - 1] + parser.start[1]
+        end = offsets[parser.end[0] - 1] + parser.end[1]
+        end = window.find('>', end) + 1
+        return window[start:end]
+
+    def rows(self, content, tag, cls):
+        text = _decode(content)
+        first = text.find(cls)
+        if first < 0:
+            return []
+        # From the row holding the first match to the end of the row holding the last
+        start = max(text.rfind('<tr', 0, first), 0)
+        end = text.find('</tr', text.rfind(cls))
+        end = text.find('>', end) + 1 if end >= 0 else 0
+
+        parser = _Row_Parser(tag, cls)
+        parser.feed(text[start:end or len(text)])
+        parser.close()
+        return parser.rows
+
+
+class Lxml_Backend:
+    """libxml2 backend
+
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        assert lxml is not None, "The 'lxml' parser backend requires lxml to be installed."
+
+    def _find(self, content, tag, cls):
+        tree = lxml.html.fromstring(content)
+        return tree.xpath('//{}[contains(concat(" ", normalize-space(@class), " "), " {} ")]'.format(tag, cls))
+
+    def texts(self, content, tag, cls):
+        return [x.text_content() for x in self._find(content, tag, cls)]
+
+    def first_html(self, content, tag, cls):
+        found = self._find(content, tag, cls)
+        if not found:
+            return None
+        return lxml.html.tostring(found[0], encoding='unicode', with_tail=False)
+
+    def rows(self, content, tag, cls):
+        rows = list()
+        seen = set()
+        for x in self._find(content, tag, cls):
+            row = next(x.iterancestors('tr'), None)
+            if row is not None and row not in seen:
+                seen.add(row)
+                rows.append([td.text_content() for td in row.xpath('./td')])
+        return rows
+
+
+class Bs4_Backend:
+    """BeautifulSoup backend
+
+    """
+
+    name = 'bs4'
+
+    def texts(self, content, tag, cls):
+        soup = BeautifulSoup(content, "html.parser")
+        return [x.get_text() for x in soup.find_all(name=tag, class_=cls)]
+
+    def first_html(self, content, tag, cls):
+        soup = BeautifulSoup(content, "html.parser")
+        found = soup.find(name=tag, class_=cls)
+        return str(found) if found is not None else None
+
+    def rows(self, content, tag, cls):
+        soup = BeautifulSoup(content, "html.parser")
+        rows = list()
+        seen = set()
+        for x in soup.find_all(name=tag, class_=cls):
+            row = x.find_parent('tr')
+            if row is not None and id(row) not in seen:
+                seen.add(id(row))
+                rows.append([td.get_text() for td in row.find_all('td', recursive=False)])
+        return rows
+
+
+backends = {
+    'stream': Stream_Backend,
+    'lxml': Lxml_Backend,
+    'bs4': Bs4_Backend,
+}
+
+
+def available_backends():
+    """Names of the backends usable in this environment
+
+    Returns
+    -------
+    list
+        Backend names
+    """
+
+    return [x for x in backends if x != 'lxml' or lxml is not None]
+
+
+def get_backend(name=None):
+    """Creates an extraction backend
+
+    Parameters
+    ----------
+    name : str, optional
+        'stream', 'lxml' or 'bs4' (the default is None, which uses default_backend)
+
+    Returns
+    -------
+    object
+        Backend with texts(), first_html() and rows() methods
+    """
+
+    name = name or default_backend
+    assert name in backends, 'Unknown HTML parser backend {}'.format(name)
+    return backends[name]()
@@ -0,0 +1,181 @@
+"""
+    Vectorized rolling-window indicators over historical bars.
+
+    Every function works on 2-D float arrays shaped (symbols, time), as built
+    by stack_bars, and computes all symbols in one NumPy pass. Missing bars
+    are NaN and are ignored inside windows.
+"""
+
+
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def stack_bars(bars_by_symbol):
+    """Aligns per-symbol bars into (symbols, time) arrays
+
+    Parameters
+    ----------
+    bars_by_symbol : dict
+        Arrays from Historicals.bars_to_arrays (or cache records) keyed by symbol
+
+    Returns
+    -------
+    dict
+        'symbols' (list), 'begins_at' (1-D datetime64 union of all timestamps)
+        and 2-D float arrays 'open', 'high', 'low', 'close', 'volume' with NaN
+        where a symbol has no bar.
+    """
+
+    symbols = list(bars_by_symbol)
+    stamps = [np.asarray(bars_by_symbol[x]['begins_at']) for x in symbols]
+    times = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype='datetime64[s]')
+
+    stacked = {'symbols': symbols, 'begins_at': times}
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        stacked[field] = np.full((len(symbols), len(times)), np.nan)
+
+    for row, (symbol, symbol_times) in enumerate(zip(symbols, stamps)):
+        columns = np.searchsorted(times, symbol_times)
+        for field in ('open', 'high', 'low', 'close', 'volume'):
+            stacked[field][row, columns] = bars_by_symbol[symbol][field]
+
+    return stacked
+
+
+def _rolling(x, window, func):
+    """Applies a NaN-aware reduction over trailing windows along the time axis
+
+    The first window-1 columns are NaN.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if window <= x.shape[-1]:
+        with warnings.catch_warnings():
+            # All-NaN windows produce NaN, which is what we want
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            out[..., window - 1:] = func(sliding_window_view(x, window, axis=-1), axis=-1)
+    return out
+
+
+def rolling_max(x, window=None):
+    """Rolling maximum along time
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (symbols, time) values
+    window : int, optional
+        Bars in the window (the default is None, which gives the running maximum since the first bar)
+
+    Returns
+    -------
+    numpy.ndarray
+        Same shape as x
+    """
+
+    if window is None:
+        return np.fmax.accumulate(np.asarray(x, dtype=np.float64), axis=-1)
+    return _rolling(x, window, np.nanmax)
+
+
+def drawdown(close, high, window=None):
+    """Fractional drawdown of the close from the rolling high
+
+    Parameters
+    ----------
+    close : numpy.ndarray
+        (symbols, time) closing prices
+    high : numpy.ndarray
+        (symbols, time) high prices
+    window : int, optional
+        Bars in the high window (the default is None, which uses the running high)
+
+    Returns
+    -------
+    numpy.ndarray
+        close / rolling high - 1, so 0 at a new high and negative below it
+    """
+
+    return np.asarray(close) / rolling_max(high, window) - 1
+
+
+def true_range(high, low, close):
+    """True range of each bar
+
+    Returns
+    -------
+    numpy.ndarray
+        max(high, previous close) - min(low, previous close). The first bar uses high - low.
+    """
+
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    prev = np.roll(np.asarray(close, dtype=np.float64), 1, axis=-1)
+    prev[..., 0] = np.nan
+    tr = np.fmax(high, prev) - np.fmin(low, prev)
+    tr[np.isnan(high) | np.isnan(low)] = np.nan
+    return tr
+
+
+def atr(high, low, close, window=14):
+    """Average true range
+
+    Parameters
+    ----------
+    high, low, close : numpy.ndarray
+        (symbols, time) prices
+    window : int, optional
+        Bars averaged (the default is 14)
+
+    Returns
+    -------
+    numpy.ndarray
+        Simple moving average of the true range
+    """
+
+    return _rolling(true_range(high, low, close), window, np.nanmean)
+
+
+def volatility(close, window=20, periods=252):
+    """Rolling annualized volatility of log returns
+
+    Parameters
+    ----------
+    close : numpy.ndarray
+        (symbols, time) closing prices
+    window : int, optional
+        Returns in the window (the default is 20)
+    periods : int, optional
+        Bars per year used to annualize (the default is 252, for daily bars)
+
+    Returns
+    -------
+    numpy.ndarray
+        Same shape as close. The first column is NaN as it has no return.
+    """
+
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.full(close.shape, np.nan)
+    returns[..., 1:] = np.log(close[..., 1:] / close[..., :-1])
+    return _rolling(returns, window, lambda a, axis: np.nanstd(a, axis=axis, ddof=1)) * np.sqrt(periods)
+
+
+def latest(x):
+    """Last non-NaN value of each row
+
+    Returns
+    -------
+    numpy.ndarray
+        1-D array with one value per symbol, NaN if a row is all NaN
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    last = x.shape[-1] - 1 - np.argmax(valid[..., ::-1], axis=-1)
+    out = np.take_along_axis(x, last[..., None], axis=-1)[..., 0]
+    out[~valid.any(axis=-1)] = np.nan
+    return out
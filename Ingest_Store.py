@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+
+
+class Ingest_Store:
+    """Cursor and de-duplication index for incremental feed ingestion
+
+    Each feed (e.g. 'dividends' or 'news:AAPL') keeps the set of record keys
+    already ingested and, for feeds returned newest first, the newest
+    timestamp seen. Repeated runs then yield only new records and stop paging
+    as soon as they reach records older than the cursor.
+    """
+
+    def __init__(self, path=':memory:'):
+        """Ingest_Store initialization
+
+        Parameters
+        ----------
+        path : str, optional
+            SQLite database file (the default is ':memory:', which keeps the store for this process only)
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS seen (
+                feed TEXT,
+                key TEXT,
+                PRIMARY KEY (feed, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS cursors (
+                feed TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+        self.db.commit()
+
+    def cursor(self, feed):
+        """Newest timestamp ingested for a feed
+
+        Parameters
+        ----------
+        feed : str
+            Feed name
+
+        Returns
+        -------
+        str
+            ISO timestamp, or None if the feed has no cursor yet
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT value FROM cursors WHERE feed = ?', (feed,)).fetchone()
+        return row[0] if row else None
+
+    def is_seen(self, feed, key):
+        """Checks whether a record key was already ingested for a feed
+
+        Returns
+        -------
+        bool
+            True if the key is in the de-duplication index
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT 1 FROM seen WHERE feed = ? AND key = ?', (feed, key)).fetchone()
+        return row is not None
+
+    def ingest(self, feed, records, key='id', time_field=None):
+        """Yields only the records not ingested before
+
+        Parameters
+        ----------
+        feed : str
+            Feed name the cursor and seen keys are stored under
+        records : iterable of dict
+            Records to filter, e.g. a paginated endpoint generator
+        key : str, optional
+            Field that uniquely identifies a record (the default is 'id')
+        time_field : str, optional
+            Timestamp field for feeds returned newest first. When given, the walk stops at the first record older than the cursor. (the default is None, which walks every record)
+
+        Yields
+        ------
+        dict
+            New records
+        """
+
+        cursor = self.cursor(feed)
+        newest = cursor
+
+        try:
+            for record in records:
+                stamp = record.get(time_field) if time_field else None
+                if cursor and stamp and stamp < cursor:
+                    break
+
+                k = str(record[key])
+                if self.is_seen(feed, k):
+                    continue
+
+                yield record
+
+                with self.lock:
+                    self.db.execute('INSERT OR IGNORE INTO seen VALUES (?, ?)', (feed, k))
+                if stamp and (newest is None or stamp > newest):
+                    newest = stamp
+        finally:
+            with self.lock:
+                self.db.commit()
+            if hasattr(records, 'close'):
+                records.close()
+
+        # Only move the cursor once the walk reached old records or the end,
+        # otherwise older unread records would be skipped next time.
+        if newest and newest != cursor:
+            with self.lock:
+                self.db.execute('INSERT OR REPLACE INTO cursors VALUES (?, ?)', (feed, newest))
+                self.db.commit()
+
+    def new_dividends(self, trader):
+        """New dividends for the account
+
+        Robinhood lists dividends newest record date first, so the walk stops
+        at the first dividend recorded before the newest one already ingested.
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Logged in Robinhood object
+
+        Yields
+        ------
+        dict
+            Dividends not ingested before
+        """
+
+        for dividend in self.ingest('dividends', trader.dividends(), key='id',
+                                    time_field='record_date'):
+            yield dividend
+
+    def new_news(self, trader, symbols):
+        """New news items for a list of stocks
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Robinhood object
+        symbols : iterable of str
+            Stock ticker symbols
+
+        Yields
+        ------
+        dict
+            News items not ingested before
+        """
+
+        for symbol in symbols:
+            symbol = str(symbol).upper()
+            for item in self.ingest('news:' + symbol, trader.news(symbol),
+                                    key='url', time_field='published_at'):
+                yield item
+
+    def close(self):
+        """Closes the database connection.
+
+        """
+
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,190 @@
+import json
+import os
+
+from Paginator import paginate
+
+
+class Instrument_Index:
+    """In-memory symbol <-> instrument URL index for Robinhood
+
+    Lookups are local dictionary reads. The index can be bulk loaded by
+    paging the whole `instruments` endpoint, saved to and loaded from a JSON
+    file, and fills in any missing entries from the network on demand.
+
+    A reused or delisted ticker can have several instruments. The symbol then
+    maps to the active, tradeable one, and a symbol whose only instrument is
+    inactive resolves to None so no order is placed against it.
+    """
+
+    def __init__(self, trader, path=None):
+        """Instrument_Index initialization
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Robinhood object whose session and endpoints are used for lookups
+        path : str, optional
+            JSON file to load the index from and save it to (the default is None, which keeps the index in memory only)
+        """
+
+        self.trader = trader
+        self.path = path
+        self.by_url = dict()
+        self.by_symbol = dict()
+        self.inactive = set()
+        self.changed = False
+
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return len(self.by_url)
+
+    def add(self, instrument):
+        """Adds an `instruments` endpoint result to the index
+
+        Parameters
+        ----------
+        instrument : dict
+            Instrument data containing at least 'url' and 'symbol'. 'state' and 'tradeable' mark inactive instruments.
+        """
+
+        url = instrument['url']
+        symbol = instrument['symbol'].upper()
+        active = instrument.get('state', 'active') == 'active' and instrument.get('tradeable', True)
+
+        if active and url in self.inactive:
+            self.inactive.discard(url)
+            self.changed = True
+        elif not active and url not in self.inactive:
+            self.inactive.add(url)
+            self.changed = True
+
+        if self.by_url.get(url) != symbol:
+            old = self.by_url.get(url)
+            if old and self.by_symbol.get(old) == url:
+                del self.by_symbol[old]
+            self.by_url[url] = symbol
+            self.changed = True
+
+        # An inactive instrument never replaces another one for its symbol
+        current = self.by_symbol.get(symbol)
+        if current is None or (active and current != url and current in self.inactive):
+            self.by_symbol[symbol] = url
+            self.changed = True
+
+    def symbol(self, url):
+        """Symbol for an instrument URL
+
+        Parameters
+        ----------
+        url : str
+            URL for the instrument
+
+        Returns
+        -------
+        str
+            Upper case ticker symbol
+        """
+
+        if url not in self.by_url:
+            self.add(self.trader.instrument_results(url))
+        return self.by_url[url]
+
+    def instrument(self, symbol):
+        """Instrument URL for a symbol
+
+        Parameters
+        ----------
+        symbol : str
+            Ticker symbol (lower or upper case accepted)
+
+        Returns
+        -------
+        str
+            Instrument URL, or None if Robinhood has no such symbol or no active instrument for it
+        """
+
+        symbol = str(symbol).upper()
+        if symbol not in self.by_symbol or self.by_symbol[symbol] in self.inactive:
+            self.refresh([symbol])
+        url = self.by_symbol.get(symbol)
+        return None if url in self.inactive else url
+
+    def refresh(self, symbols):
+        """Re-resolves the given symbols against the `instruments` endpoint
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Ticker symbols to look up again
+        """
+
+        for symbol in symbols:
+            res = self.trader.session.get(self.trader.endpoints['instruments'],
+                                          params={'symbol': str(symbol).upper()})
+            res.raise_for_status()
+            for instrument in res.json()['results']:
+                self.add(instrument)
+
+    def load_all(self):
+        """Bulk loads the index by paging through the whole `instruments` endpoint
+
+        Returns
+        -------
+        int
+            Number of instruments in the index afterwards
+        """
+
+        for instrument in paginate(self.trader.session, self.trader.endpoints['instruments'],
+                                   prefetch=self.trader.prefetch_pages):
+            self.add(instrument)
+
+        return len(self)
+
+    def load(self, path=None):
+        """Loads index entries from a JSON file
+
+        Parameters
+        ----------
+        path : str, optional
+            File to read (the default is None, which uses self.path)
+        """
+
+        path = path or self.path
+        with open(path) as f:
+            data = json.load(f)
+
+        # Files written before inactive instruments were tracked are a plain {url: symbol}
+        if 'instruments' in data:
+            inactive = set(data.get('inactive', []))
+            data = data['instruments']
+        else:
+            inactive = set()
+
+        for url, symbol in data.items():
+            self.add({'url': url, 'symbol': symbol,
+                      'state': 'inactive' if url in inactive else 'active'})
+        self.changed = False
+
+    def save(self, path=None):
+        """Writes the index to a JSON file
+
+        The file is written to a temporary name first and then moved into
+        place, so an interrupted save never leaves a truncated index.
+
+        Parameters
+        ----------
+        path : str, optional
+            File to write (the default is None, which uses self.path)
+        """
+
+        path = path or self.path
+        assert path, 'A path must be provided to save the instrument index.'
+
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'instruments': self.by_url, 'inactive': sorted(self.inactive)},
+                      f, separators=(',', ':'))
+        os.replace(tmp, path)
+        self.changed = False
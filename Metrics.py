@@ -0,0 +1,233 @@
+"""
+    Per-endpoint HTTP metrics for every session created by Transport.
+
+    Requests are grouped by logical endpoint name (the keys of
+    Robinhood.endpoints, or the host name for other sites). The process-wide
+    `registry` can be read as a dictionary with snapshot() or as Prometheus
+    text with prometheus().
+"""
+
+
+import bisect
+import threading
+from urllib.parse import urlparse
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Endpoint_Metrics:
+    """Counters for one logical endpoint
+
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_counts = [0] * (len(latency_buckets) + 1)
+        self.status = dict()
+        self.methods = dict()
+        self.paginated_calls = 0
+        self.pages = 0
+
+    def snapshot(self):
+        cumulative = list()
+        total = 0
+        for count in self.latency_counts:
+            total += count
+            cumulative.append(total)
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'latency_sum': self.latency_sum,
+            'latency_mean': self.latency_sum / self.requests if self.requests else 0.0,
+            'latency_buckets': dict(zip([str(x) for x in latency_buckets] + ['+Inf'], cumulative)),
+            'status': dict(self.status),
+            'methods': dict(self.methods),
+            'paginated_calls': self.paginated_calls,
+            'pages': self.pages,
+        }
+
+
+class Http_Metrics:
+    """Thread-safe registry of Endpoint_Metrics keyed by endpoint name
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = dict()
+        self.prefixes = list()
+
+    def register(self, endpoints):
+        """Registers logical names for URL prefixes
+
+        Parameters
+        ----------
+        endpoints : dict
+            URL prefixes keyed by name, e.g. Robinhood.endpoints
+        """
+
+        with self.lock:
+            known = {prefix for prefix, _ in self.prefixes}
+            for name, prefix in endpoints.items():
+                if prefix not in known:
+                    self.prefixes.append((prefix, name))
+                    known.add(prefix)
+            # Longest prefix first so 'quotes/historicals/' wins over 'quotes/'
+            self.prefixes.sort(key=lambda x: len(x[0]), reverse=True)
+
+    def endpoint_name(self, url):
+        """Logical endpoint name for a URL
+
+        Parameters
+        ----------
+        url : str
+            Request URL
+
+        Returns
+        -------
+        str
+            Name of the longest registered prefix, or the URL's host name
+        """
+
+        path = url.split('?', 1)[0]
+        if path.endswith('/cancel/'):
+            return 'cancel_order'
+        for prefix, name in self.prefixes:
+            if path.startswith(prefix):
+                return name
+        return urlparse(url).hostname or 'unknown'
+
+    def _get(self, name):
+        metrics = self.endpoints.get(name)
+        if metrics is None:
+            metrics = self.endpoints[name] = Endpoint_Metrics()
+        return metrics
+
+    def record_request(self, method, url, status, seconds, size):
+        """Records one completed (or failed) request
+
+        Parameters
+        ----------
+        method : str
+            HTTP method
+        url : str
+            Request URL
+        status : int
+            Response status code, or None if no response was received
+        seconds : float
+            Time taken
+        size : int
+            Response body size in bytes
+        """
+
+        name = self.endpoint_name(url)
+        with self.lock:
+            metrics = self._get(name)
+            metrics.requests += 1
+            metrics.bytes += size
+            metrics.latency_sum += seconds
+            metrics.latency_counts[bisect.bisect_left(latency_buckets, seconds)] += 1
+            metrics.methods[method] = metrics.methods.get(method, 0) + 1
+            key = str(status) if status is not None else 'error'
+            metrics.status[key] = metrics.status.get(key, 0) + 1
+            if status is None or status >= 400:
+                metrics.errors += 1
+
+    def record_retry(self, url):
+        """Records that a request to a URL is being retried
+
+        """
+
+        name = self.endpoint_name(url)
+        with self.lock:
+            self._get(name).retries += 1
+
+    def record_pages(self, url, pages):
+        """Records the number of pages walked by one paginated call
+
+        """
+
+        name = self.endpoint_name(url)
+        with self.lock:
+            metrics = self._get(name)
+            metrics.paginated_calls += 1
+            metrics.pages += pages
+
+    def reset(self):
+        """Clears all counters, keeping the registered endpoint names.
+
+        """
+
+        with self.lock:
+            self.endpoints = dict()
+
+    def snapshot(self):
+        """Current metrics
+
+        Returns
+        -------
+        dict
+            Endpoint_Metrics snapshots keyed by endpoint name
+        """
+
+        with self.lock:
+            return {name: x.snapshot() for name, x in self.endpoints.items()}
+
+    def prometheus(self, prefix='robinhood_http'):
+        """Current metrics in the Prometheus text exposition format
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Metric name prefix (the default is 'robinhood_http')
+
+        Returns
+        -------
+        str
+            Prometheus text
+        """
+
+        snapshot = self.snapshot()
+        lines = list()
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        family('requests_total', 'counter', 'HTTP requests by endpoint and status.')
+        for endpoint, x in sorted(snapshot.items()):
+            for status, count in sorted(x['status'].items()):
+                lines.append('{}_requests_total{{endpoint="{}",status="{}"}} {}'.format(
+                    prefix, endpoint, status, count))
+
+        for name, key, help_text in (('retries_total', 'retries', 'Retried HTTP requests.'),
+                                     ('response_bytes_total', 'bytes', 'Response body bytes received.'),
+                                     ('paginated_calls_total', 'paginated_calls', 'Paginated calls made.'),
+                                     ('pages_total', 'pages', 'Pages fetched by paginated calls.')):
+            family(name, 'counter', help_text)
+            for endpoint, x in sorted(snapshot.items()):
+                lines.append('{}_{}{{endpoint="{}"}} {}'.format(prefix, name, endpoint, x[key]))
+
+        family('request_duration_seconds', 'histogram', 'HTTP request latency.')
+        for endpoint, x in sorted(snapshot.items()):
+            for bound, count in x['latency_buckets'].items():
+                lines.append('{}_request_duration_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                    prefix, endpoint, bound, count))
+            lines.append('{}_request_duration_seconds_sum{{endpoint="{}"}} {}'.format(
+                prefix, endpoint, x['latency_sum']))
+            lines.append('{}_request_duration_seconds_count{{endpoint="{}"}} {}'.format(
+                prefix, endpoint, x['requests']))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Http_Metrics()
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import threading
+
+from Paginator import paginate
+
+
+class Order_Store:
+    """Local SQLite copy of the account's orders
+
+    The store is kept current by asking the `orders` endpoint only for orders
+    updated since the newest `updated_at` already stored, so each sync costs
+    O(changes) instead of a download of the whole order history. Open, buy
+    and sell order queries then run against indexed local tables.
+    """
+
+    def __init__(self, path=':memory:'):
+        """Order_Store initialization
+
+        Parameters
+        ----------
+        path : str, optional
+            SQLite database file (the default is ':memory:', which keeps the store for this process only)
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS orders (
+                id TEXT PRIMARY KEY,
+                side TEXT,
+                state TEXT,
+                cancel TEXT,
+                instrument TEXT,
+                updated_at TEXT,
+                data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS orders_open
+                ON orders (side) WHERE cancel IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS orders_updated_at
+                ON orders (updated_at);
+        ''')
+        self.db.commit()
+
+    def cursor(self):
+        """Newest `updated_at` value in the store
+
+        Returns
+        -------
+        str
+            ISO timestamp, or None if the store is empty
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT MAX(updated_at) FROM orders').fetchone()
+        return row[0]
+
+    def upsert(self, orders):
+        """Inserts or replaces orders in the store
+
+        Parameters
+        ----------
+        orders : iterable of dict
+            `orders` endpoint results
+
+        Returns
+        -------
+        int
+            Number of orders written
+        """
+
+        rows = [(o['id'], o['side'], o['state'], o['cancel'], o['instrument'],
+                 o['updated_at'], json.dumps(o, separators=(',', ':')))
+                for o in orders]
+
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.commit()
+        return len(rows)
+
+    def sync(self, trader):
+        """Fetches orders changed since the last sync
+
+        The cursor is inclusive so orders sharing the newest timestamp are
+        never missed; refetched orders simply replace their stored copy.
+
+        Parameters
+        ----------
+        trader : Robinhood
+            Logged in Robinhood object
+
+        Returns
+        -------
+        int
+            Number of orders fetched
+        """
+
+        params = dict()
+        cursor = self.cursor()
+        if cursor:
+            params['updated_at[gte]'] = cursor
+
+        orders = paginate(trader.session, trader.endpoints['orders'], params=params,
+                          page_size=trader.page_size, prefetch=trader.prefetch_pages)
+        return self.upsert(orders)
+
+    def open_orders(self, side=None):
+        """Open orders from the store
+
+        Parameters
+        ----------
+        side : str, optional
+            'buy' or 'sell' to only return that side (the default is None, which returns both)
+
+        Returns
+        -------
+        list
+            Order dictionaries, as returned by the `orders` endpoint
+        """
+
+        query = 'SELECT data FROM orders WHERE cancel IS NOT NULL'
+        args = ()
+        if side:
+            query += ' AND side = ?'
+            args = (side,)
+
+        with self.lock:
+            rows = self.db.execute(query + ' ORDER BY updated_at', args).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        """Closes the database connection.
+
+        """
+
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,122 @@
+"""
+    Pagination for Robinhood list endpoints.
+
+    Robinhood list endpoints return {'results': [...], 'next': <url or None>}.
+    paginate() follows the `next` links on a background thread so that page
+    N+1 is already downloading while the caller consumes page N.
+"""
+
+
+import queue
+import threading
+
+import Metrics
+
+
+_DONE = object()
+
+
+def fetch_page(session, url, params=None):
+    """Requests a single page
+
+    Parameters
+    ----------
+    session : requests.Session
+        Session to make the request with
+    url : str
+        Page URL
+    params : dict, optional
+        Query parameters, only used for the first page
+
+    Returns
+    -------
+    dict
+        Decoded page JSON
+    """
+
+    res = session.get(url, params=params)
+    res.raise_for_status()
+    return res.json()
+
+
+def paginate(session, url, params=None, page_size=None, prefetch=2):
+    """Yields every result of a paginated endpoint
+
+    Parameters
+    ----------
+    session : requests.Session
+        Session to make the requests with
+    url : str
+        URL of the first page
+    params : dict, optional
+        Query parameters for the first page (the default is None)
+    page_size : int, optional
+        Requested number of results per page (the default is None, which uses the endpoint default)
+    prefetch : int, optional
+        Maximum number of pages downloaded ahead of the consumer. 0 walks the pages in series. (the default is 2)
+
+    Yields
+    ------
+    dict
+        Each item of each page's `results`
+    """
+
+    params = dict(params or {})
+    if page_size:
+        params['page_size'] = page_size
+
+    if prefetch <= 0:
+        pages = 1
+        try:
+            page = fetch_page(session, url, params=params)
+            for item in page['results']:
+                yield item
+            while page.get('next'):
+                page = fetch_page(session, page['next'])
+                pages += 1
+                for item in page['results']:
+                    yield item
+        finally:
+            Metrics.registry.record_pages(url, pages)
+        return
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    fetched = [0]
+
+    def put(item):
+        # Waits for room in the queue, giving up if the consumer went away
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            page = fetch_page(session, url, params=params)
+            fetched[0] += 1
+            while put(page) and page.get('next'):
+                page = fetch_page(session, page['next'])
+                fetched[0] += 1
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                return
+            if isinstance(page, Exception):
+                raise page
+            for item in page['results']:
+                yield item
+    finally:
+        stop.set()
+        Metrics.registry.record_pages(url, fetched[0])
@@ -0,0 +1,230 @@
+"""
+    Process-wide per-host rate limiting for the shared transport.
+
+    Each host gets a token bucket refilled at `rate` requests per second and
+    holding at most `burst` tokens. Every Transport session draws from the
+    same buckets, so all clients in the process share one budget per host.
+    A throttled response pauses the whole host until its Retry-After time.
+
+    Hosts are unlimited unless a budget is configured, e.g.
+
+        Rate_Limiter.limiter.configure('finviz.com', 2, burst=4)
+
+    `suggested_budgets` lists (rate, burst) values that stay clear of the
+    sites' throttling in practice; Finviz(rate=...) sets the Finviz one.
+"""
+
+
+import email.utils
+import threading
+import time
+
+
+class Token_Bucket:
+    """Thread-safe token bucket for one host
+
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        """Token_Bucket initialization
+
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second
+        burst : float
+            Maximum number of tokens held
+        clock : callable, optional
+            Monotonic clock returning seconds (the default is time.monotonic)
+        """
+
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        # No tokens accrue before `updated`, which a pause moves into the future
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        """Takes a token, returning how long the caller must wait before using it
+
+        Returns
+        -------
+        float
+            Seconds to wait, 0 if a token was available now
+        """
+
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1
+            # Debt is paid off from the end of any pause, so callers queued
+            # behind a pause are spread out at `rate` rather than released at once
+            debt = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(self.paused_until, now) - now + debt
+
+    def pause(self, seconds):
+        """Stops handing out tokens for the given number of seconds
+
+        Parameters
+        ----------
+        seconds : float
+            Length of the pause
+        """
+
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + seconds)
+            # Start again from an empty bucket at the end of the pause so
+            # paused callers do not burst
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, self.paused_until)
+
+
+class Rate_Limiter:
+    """Registry of Token_Bucket objects keyed by host name
+
+    """
+
+    def __init__(self, budgets=None, default=None, sleep=time.sleep, clock=time.monotonic):
+        """Rate_Limiter initialization
+
+        Parameters
+        ----------
+        budgets : dict, optional
+            (rate, burst) tuples keyed by host name (the default is None)
+        default : tuple, optional
+            (rate, burst) for hosts without a budget (the default is None, which leaves them unlimited)
+        sleep : callable, optional
+            Function used to wait (the default is time.sleep)
+        clock : callable, optional
+            Monotonic clock returning seconds (the default is time.monotonic)
+        """
+
+        self.budgets = dict(budgets or {})
+        self.default = default
+        self.sleep = sleep
+        self.clock = clock
+        self.buckets = dict()
+        self.paused_until = dict()
+        self.lock = threading.Lock()
+
+    def configure(self, host, rate, burst=None):
+        """Sets the budget for a host
+
+        Parameters
+        ----------
+        host : str
+            Host name, e.g. 'api.robinhood.com'
+        rate : float
+            Requests per second, None removes the limit
+        burst : float, optional
+            Requests allowed at once (the default is None, which uses max(1, rate))
+        """
+
+        with self.lock:
+            if rate is None:
+                self.budgets.pop(host, None)
+            else:
+                self.budgets[host] = (rate, burst or max(1.0, rate))
+            self.buckets.pop(host, None)
+
+    def bucket(self, host):
+        """Token bucket for a host
+
+        Returns
+        -------
+        Token_Bucket
+            The host's bucket, or None if the host is unlimited
+        """
+
+        with self.lock:
+            if host not in self.buckets:
+                budget = self.budgets.get(host, self.default)
+                self.buckets[host] = Token_Bucket(*budget, clock=self.clock) if budget else None
+            return self.buckets[host]
+
+    def acquire(self, host):
+        """Blocks until a request to the host is allowed
+
+        Parameters
+        ----------
+        host : str
+            Host name
+
+        Returns
+        -------
+        float
+            Seconds spent waiting
+        """
+
+        bucket = self.bucket(host)
+        if bucket is None:
+            with self.lock:
+                wait = self.paused_until.get(host, 0.0) - self.clock()
+        else:
+            wait = bucket.reserve()
+        if wait > 0:
+            self.sleep(wait)
+            return wait
+        return 0.0
+
+    def pause(self, host, seconds):
+        """Holds back every request to the host for the given number of seconds
+
+        Unlimited hosts only wait out the pause and stay unlimited afterwards.
+        """
+
+        bucket = self.bucket(host)
+        if bucket is not None:
+            bucket.pause(seconds)
+            return
+        with self.lock:
+            until = self.clock() + seconds
+            self.paused_until[host] = max(self.paused_until.get(host, 0.0), until)
+
+
+def retry_after(response):
+    """Seconds to wait according to a response's Retry-After header
+
+    Parameters
+    ----------
+    response : requests.Response
+        Throttled response
+
+    Returns
+    -------
+    float
+        Seconds to wait, or None if the header is missing or invalid
+    """
+
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+# (rate, burst) per host, not applied unless configured
+suggested_budgets = {
+    'api.robinhood.com': (10, 20),
+    'finviz.com': (2, 4),
+    'www.zacks.com': (2, 4),
+}
+
+limiter = Rate_Limiter()
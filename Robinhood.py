@@ -7,8 +7,87 @@
 """
 
 
+import threading
+import time
+
 import requests
 
+import Metrics
+import Transport
+from Paginator import paginate
+from Instrument_Index import Instrument_Index
+from Order_Store import Order_Store
+
+
+class Account_Snapshot:
+    """Cached copy of the `accounts` endpoint payload
+
+    Every derived account figure (cash, buying power, etc.) is read from a
+    single fetch until the snapshot expires or is invalidated.
+    """
+
+    def __init__(self, fetch, ttl=30):
+        """Account_Snapshot initialization
+
+        Parameters
+        ----------
+        fetch : callable
+            Function with no arguments returning the `accounts` payload.
+        ttl : float, optional
+            Seconds a fetched payload stays valid. (the default is 30)
+        """
+
+        self.fetch = fetch
+        self.ttl = ttl
+        self.data = None
+        self.fetched_at = None
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        """Checks whether the snapshot needs to be refetched
+
+        Returns
+        -------
+        bool
+            True if there is no payload or it is older than the TTL.
+        """
+
+        if self.data is None:
+            return True
+        return (time.monotonic() - self.fetched_at) > self.ttl
+
+    def get(self, refresh=False):
+        """Returns the account payload, fetching it only when needed
+
+        Parameters
+        ----------
+        refresh : bool, optional
+            Force a new fetch. (the default is False)
+
+        Returns
+        -------
+        dict
+            `accounts` endpoint payload
+        """
+
+        # Concurrent readers wait for one fetch instead of each making their own
+        with self.lock:
+            if refresh or self.is_stale():
+                self.data = self.fetch()
+                self.fetched_at = time.monotonic()
+            return self.data
+
+    def invalidate(self):
+        """Drops the cached payload so the next read refetches it.
+
+        Waits for a fetch in progress, so the payload it stores is dropped too.
+        """
+
+        with self.lock:
+            self.data = None
+        self.fetched_at = None
+
+
 class Robinhood:
     """Class for interacting with Robinhood """
 
@@ -47,30 +126,66 @@ class Robinhood:
     password = None
     headers = None
     auth_token = None
+    account = None
+    account_ttl = 30
+    _account_url = None
+    instrument_index = None
+    order_store = None
+    historical_cache = None
+    batch_size = 75     # Max symbols per multi-symbol request
+    historicals_batch_size = 25     # Max symbols per multi-symbol historicals request
+    prefetch_pages = 2  # Pages downloaded ahead while paging through results
+    page_size = None    # Results per page, None uses the endpoint default
     no_trade_list = list()
 
     ###########################################################################
     #                       Logging in and Account Info
     ###########################################################################
 
-    def __init__(self):
+    default_headers = {
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Accept-Language": "en;q=1, fr;q=0.9, de;q=0.8, ja;q=0.7, nl;q=0.6, it;q=0.5",
+        "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+        "X-Robinhood-API-Version": "1.0.0",
+        "Connection": "keep-alive",
+        "User-Agent": "Robinhood/823 (iPhone; iOS 7.1.2; Scale/2.00)",
+        "Authorization": None
+    }
+
+    def __init__(self, instrument_index_path=None, order_store_path=None, historical_cache_dir=None, base_url=None):
         """Robinhood class initialization
 
-            Creats a session and establishes headers.
+            Creats a session on the shared transport and establishes headers.
+
+        Parameters
+        ----------
+        instrument_index_path : str, optional
+            JSON file backing the symbol/instrument index (the default is None, which keeps the index in memory only)
+        order_store_path : str, optional
+            SQLite file for a local order store that open order queries are served from. (the default is None, which queries the `orders` endpoint directly)
+        historical_cache_dir : str, optional
+            Directory for the on-disk historical bar cache used by get_historical_quotes(as_arrays=True). (the default is None, which disables the cache)
+        base_url : str, optional
+            Replaces 'https://api.robinhood.com' in every endpoint, e.g. to point at a local stand-in server. (the default is None)
         """
 
-        self.session = requests.session()
-        headers = {
-            "Accept": "application/json",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept-Language": "en;q=1, fr;q=0.9, de;q=0.8, ja;q=0.7, nl;q=0.6, it;q=0.5",
-            "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
-            "X-Robinhood-API-Version": "1.0.0",
-            "Connection": "keep-alive",
-            "User-Agent": "Robinhood/823 (iPhone; iOS 7.1.2; Scale/2.00)",
-            "Authorization": None
-        }
-        self.session.headers = headers
+        if base_url:
+            base_url = base_url.rstrip('/')
+            self.endpoints = {k: v.replace('https://api.robinhood.com', base_url)
+                              for k, v in Robinhood.endpoints.items()}
+            Metrics.registry.register(self.endpoints)
+
+        self.session = Transport.new_session()
+        self.session.headers = dict(self.default_headers)
+        self.account = Account_Snapshot(self._fetch_account, ttl=self.account_ttl)
+        self.account_url_lock = threading.Lock()
+        self.instrument_index = Instrument_Index(self, path=instrument_index_path)
+        if order_store_path:
+            self.order_store = Order_Store(order_store_path)
+        if historical_cache_dir:
+            from Historical_Cache import Historical_Cache
+            self.historical_cache = Historical_Cache(self, historical_cache_dir)
 
     def login(self, username=None, password=None):
         """Logs a user into a Robinhood Session
@@ -118,8 +233,8 @@ class Robinhood:
 
         return False
 
-    def get_account(self):
-        """Fetch account information
+    def _fetch_account(self):
+        """Requests account information from the `accounts` endpoint
 
         Returns
         -------
@@ -133,6 +248,52 @@ class Robinhood:
 
         return res['results'][0]
 
+    def get_account(self, refresh=False):
+        """Fetch account information
+
+        Served from the account snapshot, which is only refetched once it is
+        older than `account_ttl` seconds or has been invalidated.
+
+        Parameters
+        ----------
+        refresh : bool, optional
+            Force a new request to the `accounts` endpoint. (the default is False)
+
+        Returns
+        -------
+        dict
+            `accounts` endpoint payload
+        """
+
+        return self.account.get(refresh=refresh)
+
+    def account_url(self):
+        """URL of the account, used when placing orders
+
+        The URL never changes, so it is kept after the first fetch and does
+        not require a fresh snapshot after the snapshot is invalidated.
+
+        Returns
+        -------
+        str
+            Account URL
+        """
+
+        if self._account_url is None:
+            with self.account_url_lock:
+                if self._account_url is None:
+                    self._account_url = self.get_account()['url']
+        return self._account_url
+
+    def invalidate_account(self):
+        """Marks the cached account snapshot as out of date.
+
+        Called after anything that changes account balances, such as placing
+        or cancelling an order.
+        """
+
+        self.account.invalidate()
+
     def buying_power(self):
         """Buying power for the account
 
@@ -144,7 +305,9 @@ class Robinhood:
         float
             The buying power in $
         """
-        return self.cash() - self.cash_held_for_orders()
+
+        account = self.get_account()
+        return float(account['cash']) - float(account['cash_held_for_orders'])
 
     def unsettled_funds(self):
         # TOD: Improve this documentation
@@ -188,7 +351,10 @@ class Robinhood:
             Dollar amount available for orders.
         """
 
-        return self.buying_power() - self.cash_held_for_orders()
+        account = self.get_account()
+        held = float(account['cash_held_for_orders'])
+        buying_power = float(account['cash']) - held
+        return buying_power - held
 
     def logout(self):
         """Logs user out of session
@@ -250,28 +416,17 @@ class Robinhood:
                 "executions": []
         """
 
-        # Return all the orders from the first page
+        # When getting an order by ID, there is no ['result'] section.
         if order_id:
             url = self.endpoints['orders'] + order_id + '/'
-        else:
-            url = self.endpoints['orders']
-
-        res = self.session.get(url)
-        res.raise_for_status()
-        orders_json = res.json()
-
-        # When getting an order by ID, there is no ['result'] section.
-        try:
-            for order in orders_json['results']:
-                yield order
-        except:
-            yield orders_json
+            res = self.session.get(url)
+            res.raise_for_status()
+            yield res.json()
+            return
 
-        # Get additional pages of orders
-        while orders_json['next']:
-            orders_json = self.session.get(orders_json['next']).json()
-            for order in orders_json['results']:
-                yield order
+        for order in paginate(self.session, self.endpoints['orders'],
+                              page_size=self.page_size, prefetch=self.prefetch_pages):
+            yield order
 
     def open_orders(self):
         """Returns open orders for the user.
@@ -308,9 +463,8 @@ class Robinhood:
                 "executions": []
         """
 
-        for order in self.orders():
-            if order['cancel']:
-                yield order
+        for order in self._open_orders():
+            yield order
 
     def open_sell_orders(self):
         """Returns open sell orders for the user.
@@ -347,9 +501,8 @@ class Robinhood:
                 "executions": []
         """
 
-        for order in self.open_orders():
-            if order['side'] == 'sell':
-                yield order
+        for order in self._open_orders(side='sell'):
+            yield order
 
     def open_buy_orders(self):
         """Returns open buy orders for the user.
@@ -386,8 +539,43 @@ class Robinhood:
                 "executions": []
         """
 
-        for order in self.open_orders():
-            if order['side'] == 'buy':
+        for order in self._open_orders(side='buy'):
+            yield order
+
+    def sync_orders(self):
+        """Brings the local order store up to date
+
+        Returns
+        -------
+        int
+            Number of changed orders fetched
+        """
+
+        assert self.order_store, 'An order store is required to sync orders.'
+        return self.order_store.sync(self)
+
+    def _open_orders(self, side=None):
+        """Open orders, from the order store when there is one
+
+        Parameters
+        ----------
+        side : str, optional
+            'buy' or 'sell' to only return that side (the default is None, which returns both)
+
+        Yields
+        ------
+        dict
+            Open orders data
+        """
+
+        if self.order_store:
+            self.sync_orders()
+            for order in self.order_store.open_orders(side=side):
+                yield order
+            return
+
+        for order in self.orders():
+            if order['cancel'] and (side is None or order['side'] == side):
                 yield order
 
     ###########################################################################
@@ -418,17 +606,10 @@ class Robinhood:
                 'account'
         """
 
-        positions = self.session.get(self.endpoints['positions']).json()
-
-        for position in positions['results']:
+        for position in paginate(self.session, self.endpoints['positions'],
+                                 page_size=self.page_size, prefetch=self.prefetch_pages):
             yield position
 
-        # Get additional pages of securities
-        while positions['next']:
-            positions = self.session.get(positions['next']).json()
-            for position in positions['results']:
-                yield position
-
     def nonzero_positions_held(self):
         """Returns positions with shares held > 0
 
@@ -454,6 +635,66 @@ class Robinhood:
             if float(position['quantity']) > 0:
                 yield position
 
+    ###########################################################################
+    #                       GET DIVIDENDS AND NEWS
+    ###########################################################################
+
+    def dividends(self):
+        """Returns dividends endpoint data for the account
+
+        Yields
+        ------
+        dict
+            Dividend information. Contents...
+                'id'
+                'url'
+                'account'
+                'instrument'
+                'amount'
+                'rate'
+                'position'
+                'withholding'
+                'record_date'
+                'payable_date'
+                'paid_at'
+                'state'
+        """
+
+        for dividend in paginate(self.session, self.endpoints['dividends'],
+                                 page_size=self.page_size, prefetch=self.prefetch_pages):
+            yield dividend
+
+    def news(self, symbol):
+        """Returns news items for a stock, newest first
+
+        Parameters
+        ----------
+        symbol : str
+            Stock ticker symbol (lower or upper case accepted)
+
+        Yields
+        ------
+        dict
+            News item. Contents...
+                'uuid'
+                'url'
+                'title'
+                'source'
+                'summary'
+                'published_at'
+                'updated_at'
+                'api_source'
+                'author'
+                'num_clicks'
+                'instrument'
+                'preview_image_url'
+        """
+
+        url = self.endpoints['news'] + str(symbol).upper() + '/'
+        for item in paginate(self.session, url,
+                             page_size=self.page_size, prefetch=self.prefetch_pages):
+            yield item
+
     ###########################################################################
     #                           GET DATA
     ###########################################################################
@@ -496,6 +737,7 @@ class Robinhood:
          """
 
         res = self.session.get(url)
+        res.raise_for_status()
         return res.json()
 
     def instruments(self, stock):
@@ -522,6 +764,38 @@ class Robinhood:
 
         return res['results']
 
+    def symbol_for_instrument(self, url):
+        """Symbol for an instrument URL, resolved through the instrument index
+
+        Parameters
+        ----------
+        url : str
+            URL for the instrument
+
+        Returns
+        -------
+        str
+            Upper case ticker symbol
+        """
+
+        return self.instrument_index.symbol(url)
+
+    def instrument_for_symbol(self, symbol):
+        """Instrument URL for a symbol, resolved through the instrument index
+
+        Parameters
+        ----------
+        symbol : str
+            Ticker symbol (lower or upper case accepted)
+
+        Returns
+        -------
+        str
+            Instrument URL, or None if the symbol is unknown
+        """
+
+        return self.instrument_index.instrument(symbol)
+
     def quote(self, symbol):
         """Fetch stock quote
             Args:
@@ -550,11 +824,41 @@ class Robinhood:
         symbol = str(symbol).upper()
 
         url = self.endpoints['quotes'] + symbol + "/"
-        res = requests.get(url)
+        res = self.session.get(url)
         res.raise_for_status()
 
         return res.json()
 
+    def quotes(self, symbols):
+        """Fetch quotes for many stocks in as few requests as possible
+
+        Uses the multi-symbol form of the `quotes` endpoint, splitting the
+        symbols into requests of at most `batch_size` symbols.
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock ticker symbols (lower or upper case accepted)
+
+        Returns
+        -------
+        dict
+            Quote dictionaries keyed by upper case symbol. Symbols the
+            endpoint did not recognize map to None.
+        """
+
+        symbols = self._unique_symbols(symbols)
+        results = dict()
+
+        for chunk in self._chunks(symbols, self.batch_size):
+            res = self.session.get(self.endpoints['quotes'],
+                                   params={'symbols': ','.join(chunk)})
+            res.raise_for_status()
+            for symbol, quote in zip(chunk, res.json()['results']):
+                results[symbol] = quote
+
+        return results
+
     def fundamentals(self, symbol):
         """Fetches Fundamentals data from Robinhood
 
@@ -592,11 +896,41 @@ class Robinhood:
         symbol = str(symbol).upper()
 
         url = self.endpoints['fundamentals'] + symbol + "/"
-        res = requests.get(url)
+        res = self.session.get(url)
         res.raise_for_status()
 
         return res.json()
 
+    def fundamentals_many(self, symbols):
+        """Fetches Fundamentals data for many stocks in as few requests as possible
+
+        Uses the multi-symbol form of the `fundamentals` endpoint, splitting
+        the symbols into requests of at most `batch_size` symbols.
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock symbols, can be lower or upper case.
+
+        Returns
+        -------
+        dict
+            Fundamentals dictionaries (see `fundamentals`) keyed by upper case
+            symbol. Symbols the endpoint did not recognize map to None.
+        """
+
+        symbols = self._unique_symbols(symbols)
+        results = dict()
+
+        for chunk in self._chunks(symbols, self.batch_size):
+            res = self.session.get(self.endpoints['fundamentals'],
+                                   params={'symbols': ','.join(chunk)})
+            res.raise_for_status()
+            for symbol, data in zip(chunk, res.json()['results']):
+                results[symbol] = data
+
+        return results
+
     def high_52_weeks(self, symbol):
         """52 week high for a given stock symbol
 
@@ -614,8 +948,31 @@ class Robinhood:
         x = self.fundamentals(symbol=symbol)['high_52_weeks']
         return float(x)
 
+    def high_52_weeks_many(self, symbols):
+        """52 week highs for many stock symbols
 
-    def get_historical_quotes(self, symbol, interval='day', span='year'):
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock symbols, upper or lower case is fine.
+
+        Returns
+        -------
+        dict
+            52 week high dollar amounts keyed by upper case symbol. Symbols
+            without fundamentals or a 52 week high map to None.
+        """
+
+        highs = dict()
+        for symbol, data in self.fundamentals_many(symbols).items():
+            if data and data.get('high_52_weeks') is not None:
+                highs[symbol] = float(data['high_52_weeks'])
+            else:
+                highs[symbol] = None
+        return highs
+
+
+    def get_historical_quotes(self, symbol, interval='day', span='year', as_arrays=False):
         """Fetches historical quote data for a stock
 
         Parameters
@@ -626,6 +983,9 @@ class Robinhood:
             Resolution of the data for historical results. (the default is 'day', which provides one result per day)
         span : str, optional
             Length of the data (the default is 'year', which returns data for the last year)
+        as_arrays : bool, optional
+            Return columnar NumPy arrays instead of the raw JSON (the default is False). Requires numpy.
+            With a historical cache, only bars newer than the cached ones are requested and the arrays are memory-mapped views of the cache file.
 
         Notes
         -----
@@ -648,13 +1008,56 @@ class Robinhood:
                 'low_price'
                 'close_price'
                 'session'
+
+            With as_arrays=True, a dictionary of arrays sorted by time:
+                'begins_at' (datetime64[s]), 'open', 'high', 'low', 'close'
+                (float64), 'volume' (int64), 'regular' and 'interpolated' (bool)
+            The arrays are empty if Robinhood returned no bars for the symbol.
+            A failed request raises requests.HTTPError.
         """
 
+        if as_arrays and self.historical_cache:
+            bars = self.historical_cache.get(symbol, interval=interval, span=span)
+            return {name: bars[name] for name in bars.dtype.names}
+
         params={'symbols': symbol.upper(),
                   'interval': interval,
                   'span': span}
 
         res=self.session.get(self.endpoints['historicals'], params=params)
+        res.raise_for_status()
+        if not as_arrays:
+            return res.json()
+
+        # An unknown symbol comes back without an entry or with no bars
+        from Historicals import bars_to_arrays, historicals_to_arrays
+        arrays = historicals_to_arrays(res.json()).get(symbol.upper())
+        return arrays if arrays is not None else bars_to_arrays([])
+
+    def get_historical_quotes_many(self, symbols, interval='day', span='year'):
+        """Fetches historical quote data for several stocks in one request
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock ticker symbols. Callers should keep this to at most `historicals_batch_size` symbols.
+        interval : str, optional
+            Resolution of the data (the default is 'day')
+        span : str, optional
+            Length of the data (the default is 'year')
+
+        Returns
+        -------
+        Dict
+            `historicals` endpoint payload with one entry in ['results'] per symbol
+        """
+
+        params={'symbols': ','.join(self._unique_symbols(symbols)),
+                'interval': interval,
+                'span': span}
+
+        res=self.session.get(self.endpoints['historicals'], params=params)
+        res.raise_for_status()
         return res.json()
 
     ###########################################################################
@@ -691,8 +1094,9 @@ class Robinhood:
             assert url, "An Order ID or URL must be provided to cancel an order"
 
         res=self.session.post(url)
+        self.invalidate_account()
 
-        if res.json == {}:
+        if res.ok:
             return True
         else:
             return False
@@ -710,6 +1114,7 @@ class Robinhood:
         for order in self.open_sell_orders():
             res=self.session.post(order['cancel'])
             res.raise_for_status()
+        self.invalidate_account()
 
         return success
 
@@ -755,7 +1160,28 @@ class Robinhood:
         symbol=symbol.upper()
         self.no_trade_list=[x.upper() for x in self.no_trade_list]
         assert symbol not in self.no_trade_list, 'You may not trade a stock in your no trade list'
-        instrument=self.quote(symbol=symbol)['instrument']
+        instrument=self.instrument_for_symbol(symbol)
+        payload=self._order_payload(symbol, instrument, self.account_url(), quantity,
+                                    trigger, order_type, side, time_in_force, stop_price, price)
+
+        # Create trade in Robinhood
+        res=self.session.post(self.endpoints['orders'], data=payload)
+        self.invalidate_account()
+        res.raise_for_status()
+        return res.json()
+
+    def _order_payload(self, symbol, instrument, account, quantity, trigger, order_type, side, time_in_force, stop_price=0.0, price=0.0):
+        """Validates order parameters and builds the `orders` request payload
+
+        Parameters are the same as `place_order`, plus the resolved
+        instrument URL and account URL.
+
+        Returns
+        -------
+        dict
+            Payload for posting to the `orders` endpoint
+        """
+
         assert instrument != None, 'The instrument for the symbol provided could not be found. Recheck symbol {}'.format(
             symbol)
         assert quantity > 0 and quantity == int(
@@ -770,7 +1196,7 @@ class Robinhood:
 
         # Create payload dictionary for the request
         payload={
-            'account': self.get_account()['url'],
+            'account': account,
             'instrument': instrument,
             'symbol': symbol,
             'quantity': quantity,
@@ -790,10 +1216,7 @@ class Robinhood:
                 price), "The price provided is not a valid number"
             payload['price']=round(price, 2)
 
-        # Create trade in Robinhood
-        res=self.session.post(self.endpoints['orders'], data=payload)
-        res.raise_for_status()
-        return res.json()
+        return payload
 
     ###########################################################################
     #                           OTHER HELPFUL THINGS
@@ -814,3 +1237,43 @@ class Robinhood:
         """
 
         return type(n) in [int, float, complex]
+
+    def _unique_symbols(self, symbols):
+        """Upper cases symbols and drops duplicates, keeping the order
+
+        Parameters
+        ----------
+        symbols : iterable of str
+            Stock ticker symbols
+
+        Returns
+        -------
+        list
+            Unique upper case symbols
+        """
+
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        return list(dict.fromkeys(str(x).upper() for x in symbols))
+
+    def _chunks(self, items, size):
+        """Splits a list into consecutive lists of at most `size` items
+
+        Parameters
+        ----------
+        items : list
+            Items to split
+        size : int
+            Maximum chunk length
+
+        Yields
+        ------
+        list
+            Consecutive slices of `items`
+        """
+
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+
+Metrics.registry.register(Robinhood.endpoints)
@@ -4,15 +4,18 @@ import sys
 import datetime
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from Robinhood import Robinhood
+from Scheduler import Scheduler
+from Stop_State import Stop_State
 
 class Robinhood_Trailing_Stop:
     """Class for creating Trailing Stops for Robinhood
     """
 
     # TODO: Make limit_percent be optional. Update params, doc string, and sell.
-    def __init__(self, username, password, trailing_percent, limit_percent, check_interval=60*2, run_length=7*60*60):
+    def __init__(self, username, password, trailing_percent, limit_percent, check_interval=60*2, run_length=7*60*60, instrument_index_path=None, max_workers=8, cycle_timeout=None, state_path=None, atr_multiple=None, atr_window=14, trader=None):
         """Initialization of Class
 
             Establishes Robinhood object, a trailing percent rule to follow and
@@ -32,6 +35,20 @@ class Robinhood_Trailing_Stop:
             Optional number to represent how often owned stocks should be checked. (The default 2 minutes)
         run_length : float, optional
             Optional number to represent how long the loop should run for in seconds. (The default is 7 hours)
+        instrument_index_path : str, optional
+            Optional JSON file to persist the symbol/instrument index in between runs. (The default is None)
+        max_workers : int, optional
+            Number of sell orders cancelled or placed at the same time. 1 sends them one at a time. Stops are evaluated one after another from a single bulk market snapshot, so positions are not checked concurrently. (The default is 8)
+        cycle_timeout : float, optional
+            Seconds a cycle waits in total for its order requests (earlier cycles' leftovers, cancels and places) before moving on. Requests still running are waited for before the next cycle changes any orders. (The default is None, which uses check_interval)
+        state_path : str, optional
+            Optional JSON file for per-position state. When given, stops trail the highest price seen since entry instead of the 52 week high. (The default is None)
+        atr_multiple : float, optional
+            Optional volatility scaled stop. When given, the stop is high - atr_multiple * ATR of daily bars, falling back to the trailing percent for stocks without an ATR. Requires numpy. (The default is None)
+        atr_window : int, optional
+            Number of daily bars in the ATR. (The default is 14)
+        trader : Robinhood, optional
+            Optional Robinhood object to use instead of creating one, e.g. one pointed at a local stand-in server. It is still logged in. (The default is None)
 
         """
 
@@ -54,12 +71,22 @@ class Robinhood_Trailing_Stop:
         self.lp = float(limit_percent)
         self.check_interval = check_interval
         self.run_length = run_length
+        self.max_workers = max_workers
+        self.cycle_timeout = cycle_timeout or check_interval
+        self.executor = None
+        self.pending = set()
+        self.cancel_wait = 10
+        self.state = Stop_State(state_path) if state_path else None
+        self.atr_multiple = atr_multiple
+        self.atr_window = atr_window
+        self.atr = dict()
+        self.atr_date = None
 
         logging.info(
             'Trailing percent is is {} and limit percent is {}'.format(self.tp, self.lp))
 
         # Create Robinhood session
-        self.trader = Robinhood()
+        self.trader = trader or Robinhood(instrument_index_path=instrument_index_path)
         self.trader.login(username=self.username, password=self.password)
 
     def _validate_percent(self, n):
@@ -84,81 +111,371 @@ class Robinhood_Trailing_Stop:
     def main_loop(self):
         """Main loop that runs the processing steps for the trailing stop.
 
-        Loop will run until the run_lenght time is reached. 
+        Loop will run until the run_lenght time is reached. Stocks are checked
+        and sell orders reconciled every check_interval, with the scheduler
+        sleeping in between.
 
         """
 
-        start_time = datetime.datetime.now()
-        stock_check_time = datetime.datetime.now()
+        self.scheduler = Scheduler()
+        self.scheduler.add_job('check_stocks', self.check_interval, self.check_stocks)
+        self.scheduler.run(duration=self.run_length)
 
-        while True:
-            # Check if day is over, exit if so
-            time_dif = (datetime.datetime.now() - start_time).total_seconds()
-            if time_dif > self.run_length:
-                break
-
-            time_dif = (datetime.datetime.now() - stock_check_time).total_seconds()
-            if time_dif > self.check_interval:
-                stock_check_time = datetime.datetime.now()
-                self.cancel_all_sells()
-                time.sleep(10)
-                self.check_stocks()
+        for name, stats in self.scheduler.stats().items():
+            logging.info('Job {}: {}'.format(name, stats))
 
     def check_stocks(self):
         """Checks account for stocks owned. If any, then checks if a stop target has been met.
 
+        The sell orders wanted for the stocks that hit their stop are then
+        reconciled against the open sell orders, so only orders that differ
+        are cancelled or placed.
+
         """
 
+        start_count = self.trader.session.request_count
+
         # Get a list of stocks that are currently held
         self.stock_list = [x for x in self.trader.nonzero_positions_held()]
         n = len(self.stock_list)
         logging.info('There are {} stocks held currently.'.format(n))
 
-        # If there are no stocks... just exit
-        if n == 0:
+        # Fetch prices for every stock at once, then check each stock against them
+        snapshot = self.market_snapshot(self.stock_list) if n else dict()
+        if self.atr_multiple and n:
+            try:
+                self.refresh_atr([x['symbol'] for x in snapshot.values()])
+            except Exception:
+                # Stocks without an ATR fall back to the trailing percent
+                logging.exception('Failed to refresh ATRs.')
+        desired = dict()
+        evaluated = set()
+        for stock in self.stock_list:
+            if stock['instrument'] not in snapshot:
+                continue    # Symbol could not be resolved, logged by market_snapshot
+            try:
+                order = self.desired_sell(stock, snapshot.get(stock['instrument']))
+            except Exception:
+                logging.exception('Failed to check {}.'.format(stock['instrument']))
+                continue
+            evaluated.add(stock['instrument'])
+            if order:
+                desired[stock['instrument']] = order
+
+        # Sells of stocks that could not be checked are left as they are
+        self.reconcile_sells(desired, evaluated)
+
+        if self.state:
+            self.state.prune(x['instrument'] for x in self.stock_list)
+            self.state.save()
+
+        logging.info('Checked {} stocks with {} requests.'.format(
+            n, self.trader.session.request_count - start_count))
+
+        # Keep newly resolved symbols for the next run
+        index = self.trader.instrument_index
+        if index.path and index.changed:
+            index.save()
+
+    def market_snapshot(self, stocks):
+        """Fetches symbol, last price and 52 week high for positions in bulk
+
+        Symbols are resolved through the instrument index and prices come from
+        one multi-symbol quotes request and one multi-symbol fundamentals
+        request per `batch_size` symbols. When per-position state is kept, the
+        high is the running high since entry and no fundamentals are fetched.
+        Positions whose symbol can not be resolved are logged and left out.
+
+        Parameters
+        ----------
+        stocks : list
+            Position dictionaries
+
+        Returns
+        -------
+        dict
+            Dictionaries with 'symbol', 'last' and 'high' keyed by instrument URL.
+            'last' and 'high' are None when Robinhood returned no data.
+            Positions without a symbol are missing.
+        """
+
+        symbols = dict()
+        for stock in stocks:
+            try:
+                symbols[stock['instrument']] = self.trader.symbol_for_instrument(stock['instrument'])
+            except Exception:
+                logging.exception('Failed to resolve the symbol for {}.'.format(stock['instrument']))
+        stocks = [x for x in stocks if x['instrument'] in symbols]
+
+        quotes = self.trader.quotes(symbols.values())
+        if self.state:
+            highs = dict()
+        else:
+            highs = self.trader.high_52_weeks_many(symbols.values())
+
+        snapshot = dict()
+        for stock in stocks:
+            instrument = stock['instrument']
+            symbol = symbols[instrument]
+            quote = quotes.get(symbol)
+            last = float(quote['last_trade_price']) if quote else None
+            high = highs.get(symbol)
+            if self.state and last is not None:
+                high = self.state.update(instrument, symbol, last,
+                                         entry_price=float(stock['average_buy_price']))
+            snapshot[instrument] = {
+                'symbol': symbol,
+                'last': last,
+                'high': high,
+            }
+        return snapshot
+
+    def refresh_atr(self, symbols):
+        """Updates the average true range of daily bars for the given symbols
+
+        ATRs are recomputed for every symbol once a day, and otherwise only
+        for symbols that have not been fetched yet. Symbols without enough
+        bars for an ATR are stored as None, so they are not fetched again
+        until the next day. All symbols are fetched with multi-symbol
+        historicals requests and computed in one vectorized pass.
+
+        Parameters
+        ----------
+        symbols : list
+            Ticker symbols
+        """
+
+        import Indicators
+        from Historicals import historicals_to_arrays
+
+        today = datetime.date.today()
+        if self.atr_date != today:
+            self.atr = dict()
+            self.atr_date = today
+
+        missing = [x for x in symbols if x not in self.atr]
+        if not missing:
             return
 
-        # Check each stock
-        for stock in self.stock_list:
-            self.check_stop(stock)
+        bars = dict()
+        for chunk in self.trader._chunks(missing, self.trader.historicals_batch_size):
+            data = self.trader.get_historical_quotes_many(chunk, interval='day', span='3month')
+            bars.update(historicals_to_arrays(data))
+
+        stacked = Indicators.stack_bars(bars)
+        atr = Indicators.latest(Indicators.atr(stacked['high'], stacked['low'], stacked['close'],
+                                               window=self.atr_window))
+        for symbol, value in zip(stacked['symbols'], atr):
+            if value == value:   # Not NaN
+                self.atr[symbol] = float(value)
+        for symbol in missing:
+            self.atr.setdefault(symbol, None)
+
+    def reconcile_sells(self, desired, evaluated=None):
+        """Makes the open sell orders match the desired sell orders
+
+        Only open sell orders for evaluated instruments are considered. One
+        is kept if a sell is wanted for its instrument with the same quantity
+        and its limit price is at or below the wanted limit (it is at least
+        as likely to fill). Every other one is cancelled and wanted sells
+        without a kept order are placed, except for instruments where a
+        cancel failed, as their shares are still held. Nothing is changed
+        while requests from an earlier cycle are running.
 
-    def check_stop(self, stock):
-        """Check a stock to see if the stop price has been hit and if so enters a sell
+        Parameters
+        ----------
+        desired : dict
+            Order dictionaries from desired_sell keyed by instrument URL
+        evaluated : set, optional
+            Instrument URLs whose stop was checked. Open sells for any other instrument are left alone. (the default is None, which considers every open sell)
+
+        Returns
+        -------
+        tuple
+            (number of orders kept, number cancelled, number placed)
+        """
+
+        # One cycle_timeout covers every wait below
+        deadline = time.monotonic() + self.cycle_timeout
+
+        if self.pending:
+            wait(self.pending, timeout=max(0.0, deadline - time.monotonic()))
+            self.pending = {x for x in self.pending if not x.done()}
+            if self.pending:
+                logging.warning('{} order requests from an earlier cycle are still running, '
+                                'not changing sell orders.'.format(len(self.pending)))
+                return 0, 0, 0
+
+        keep = set()
+        cancels = list()
+        for order in self.trader.open_sell_orders():
+            if evaluated is not None and order['instrument'] not in evaluated:
+                continue
+            want = desired.get(order['instrument'])
+            if (want and order['instrument'] not in keep
+                    and int(float(order['quantity'])) == want['quantity']
+                    and order['price'] is not None
+                    and float(order['price']) <= want['price']):
+                keep.add(order['instrument'])
+            else:
+                cancels.append(order)
+
+        results = self._run_tasks([(self.trader.cancel_order, {'url': x['cancel']}, x['instrument'])
+                                   for x in cancels], deadline=deadline)
+        failed = {x['instrument'] for x, result in zip(cancels, results) if result is not True}
+        for instrument in failed & set(desired):
+            logging.warning('Not placing a sell for {} as its open sell order was not cancelled.'.format(
+                desired[instrument]['symbol']))
+
+        places = [x for instrument, x in desired.items() if instrument not in keep | failed]
+
+        # Shares held by a cancelled order are not released immediately
+        replaced = {x['instrument'] for x in cancels} & set(desired)
+        if replaced and places:
+            time.sleep(self.cancel_wait)
+
+        self._run_tasks([(self.sell, x, x['symbol']) for x in places], deadline=deadline)
+
+        cancelled = len(cancels) - sum(1 for x in results if x is not True)
+        logging.info('Sell orders: {} kept, {} cancelled, {} failed to cancel, {} placed.'.format(
+            len(keep), cancelled, len(cancels) - cancelled, len(places)))
+        return len(keep), cancelled, len(places)
+
+    def _run_tasks(self, tasks, deadline=None):
+        """Runs tasks on a thread pool, waiting at most until the deadline
+
+        A failing task is logged without affecting the others. Tasks that
+        time out keep running and are kept in `pending` until they finish.
+
+        Parameters
+        ----------
+        tasks : list
+            (function, keyword arguments, label for logging) tuples
+        deadline : float, optional
+            time.monotonic() value to stop waiting at (the default is None, which waits cycle_timeout seconds)
+
+        Returns
+        -------
+        list
+            Each task's return value in task order, None if it failed or timed out
+        """
+
+        def run(func, kwargs, label):
+            try:
+                return func(**kwargs)
+            except Exception:
+                logging.exception('Failed {} for {}.'.format(func.__name__, label))
+                return None
+
+        if self.max_workers <= 1:
+            return [run(*task) for task in tasks]
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        futures = [self.executor.submit(run, *task) for task in tasks]
+        if deadline is None:
+            deadline = time.monotonic() + self.cycle_timeout
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+        for future, task in zip(futures, tasks):
+            if future in not_done and not future.cancel():
+                self.pending.add(future)
+            if future in not_done:
+                logging.warning('Timed out on {}.'.format(task[2]))
+
+        return [x.result() if x in done else None for x in futures]
+
+    def desired_sell(self, stock, data=None):
+        """Works out whether a stock has hit its stop and the sell order it needs
 
         Parameters
         ----------
         stock : dict
             Dictionary containing stock position information
+        data : dict, optional
+            Prefetched 'symbol', 'last' and 'high' for the stock (the default is None, which fetches them)
 
+        Returns
+        -------
+        dict
+            'instrument', 'symbol', 'quantity', 'price', 'last', 'high' and 'stop' for the sell, or None if the stop was not hit
         """
 
         # Get basic stock info needed
         instrument = stock['instrument']
         quantity = int(float(stock['quantity']))
-        symbol = self.trader.instrument_results(instrument)['symbol']
+
+        if data is None:
+            symbol = self.trader.symbol_for_instrument(instrument)
+            data = {'symbol': symbol,
+                    'high': self.trader.high_52_weeks(symbol),
+                    # If this is anything other than "Last", such as bid/ask, then need to check that price isn't $0 during after-hours
+                    'last': float(self.trader.quote(symbol)['last_trade_price'])}
+
+        symbol = data['symbol']
         assert symbol, "You must provide a symbol."
+        assert data['high'] is not None and data['last'] is not None, \
+            'No price data returned for {}.'.format(symbol)
 
         # Get Stock Price Info
-        hi = float(self.trader.high_52_weeks(symbol))
-        # If this is anything other than "Last", such as bid/ask, then need to check that price isn't $0 during after-hours
-        last = float(self.trader.quote(symbol)['last_trade_price'])
-        stop = (1-self.tp) * hi
+        hi = float(data['high'])
+        last = float(data['last'])
+        if self.atr_multiple and self.atr.get(symbol) is not None:
+            stop = hi - self.atr_multiple * self.atr[symbol]
+        else:
+            stop = (1-self.tp) * hi
         limit_price = (1 - self.lp) * last
         limit_price = round(limit_price, 2)
 
         # If the price has fallen below the threshold
         if last <= stop:
-            # Place Order
-            r = self.trader.place_order(symbol=symbol,
-                                        quantity=quantity,
-                                        trigger='immediate',
-                                        order_type='limit',
-                                        price=limit_price,
-                                        side='sell',
-                                        time_in_force='gfd')
-            s1 = '{}: {} shares sold. Last: {}, High: {}, Stop: {}, Limit: {}'.format(
-                symbol, quantity, last, hi, stop, limit_price)
-            logging.info(s1)
+            return {'instrument': instrument, 'symbol': symbol, 'quantity': quantity,
+                    'price': limit_price, 'last': last, 'high': hi, 'stop': stop}
+        return None
+
+    def sell(self, symbol, quantity, price, last=None, high=None, stop=None, **kwargs):
+        """Places a good-for-day limit sell order
+
+        Parameters
+        ----------
+        symbol : str
+            Stock symbol
+        quantity : int
+            Number of shares to sell
+        price : float
+            Limit price
+        last, high, stop : float, optional
+            Prices that triggered the sell, only used for logging
+        """
+
+        r = self.trader.place_order(symbol=symbol,
+                                    quantity=quantity,
+                                    trigger='immediate',
+                                    order_type='limit',
+                                    price=price,
+                                    side='sell',
+                                    time_in_force='gfd')
+        s1 = '{}: {} shares sold. Last: {}, High: {}, Stop: {}, Limit: {}'.format(
+            symbol, quantity, last, high, stop, price)
+        logging.info(s1)
+        return r
+
+    def check_stop(self, stock, data=None):
+        """Check a stock to see if the stop price has been hit and if so enters a sell
+
+        Parameters
+        ----------
+        stock : dict
+            Dictionary containing stock position information
+        data : dict, optional
+            Prefetched 'symbol', 'last' and 'high' for the stock (the default is None, which fetches them)
+
+        """
+
+        order = self.desired_sell(stock, data)
+        if order:
+            self.sell(**order)
 
     def cancel_all_sells(self):
         """Cancels all open sell orders
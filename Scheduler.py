@@ -0,0 +1,170 @@
+import heapq
+import logging
+import threading
+import time
+
+
+class Job:
+    """A function run by the Scheduler on a fixed interval
+
+    """
+
+    def __init__(self, name, interval, func, deadline):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.deadline = deadline
+        self.runs = 0
+        self.missed = 0
+        self.errors = 0
+        self.total_drift = 0.0
+        self.max_drift = 0.0
+        self.total_runtime = 0.0
+
+    def stats(self):
+        """Run statistics for the job
+
+        Returns
+        -------
+        dict
+            runs, missed deadlines, errors, mean/max drift (seconds late) and mean runtime
+        """
+
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'missed': self.missed,
+            'errors': self.errors,
+            'mean_drift': self.total_drift / self.runs if self.runs else 0.0,
+            'max_drift': self.max_drift,
+            'mean_runtime': self.total_runtime / self.runs if self.runs else 0.0,
+        }
+
+
+class Scheduler:
+    """Deadline based scheduler for periodic jobs
+
+    Sleeps until the earliest job deadline instead of polling the clock, so
+    an idle loop uses no CPU. Deadlines advance by whole intervals from the
+    original start, so slow runs do not shift later runs; deadlines that
+    passed while another job was running are counted as missed and skipped.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """Scheduler initialization
+
+        Parameters
+        ----------
+        clock : callable, optional
+            Monotonic clock returning seconds (the default is time.monotonic)
+        """
+
+        self.clock = clock
+        self.jobs = dict()
+        self.queue = list()
+        self.counter = 0
+        self.stopping = threading.Event()
+
+    def add_job(self, name, interval, func, delay=None):
+        """Adds a job to the schedule
+
+        Parameters
+        ----------
+        name : str
+            Unique name for the job
+        interval : float
+            Seconds between runs
+        func : callable
+            Function called with no arguments
+        delay : float, optional
+            Seconds until the first run (the default is None, which waits one interval)
+        """
+
+        assert interval > 0, 'Job interval must be > 0'
+        assert name not in self.jobs, 'A job named {} already exists'.format(name)
+
+        if delay is None:
+            delay = interval
+        job = Job(name, interval, func, self.clock() + delay)
+        self.jobs[name] = job
+        self._push(job)
+
+    def _push(self, job):
+        # The counter breaks deadline ties in the order jobs were added
+        self.counter += 1
+        heapq.heappush(self.queue, (job.deadline, self.counter, job))
+
+    def stop(self):
+        """Stops the scheduler after the job currently running, if any.
+
+        """
+
+        self.stopping.set()
+
+    def run(self, duration=None):
+        """Runs jobs until stopped or the duration has passed
+
+        Parameters
+        ----------
+        duration : float, optional
+            Seconds to run for (the default is None, which runs until stop() is called)
+        """
+
+        end = None if duration is None else self.clock() + duration
+        self.stopping.clear()
+
+        while self.queue and not self.stopping.is_set():
+            deadline, _, job = self.queue[0]
+            if end is not None and deadline > end:
+                wait = end - self.clock()
+                if wait > 0:
+                    self.stopping.wait(wait)
+                break
+
+            wait = deadline - self.clock()
+            if wait > 0:
+                # Interruptible sleep until the deadline
+                if self.stopping.wait(wait):
+                    break
+
+            heapq.heappop(self.queue)
+            self._run_job(job)
+            self._push(job)
+
+    def _run_job(self, job):
+        """Runs one job and moves its deadline to the next future interval
+
+        """
+
+        start = self.clock()
+        drift = start - job.deadline
+        job.total_drift += drift
+        job.max_drift = max(job.max_drift, drift)
+
+        try:
+            job.func()
+        except Exception:
+            job.errors += 1
+            logging.exception('Scheduled job {} failed.'.format(job.name))
+
+        now = self.clock()
+        job.runs += 1
+        job.total_runtime += now - start
+
+        job.deadline += job.interval
+        if job.deadline <= now:
+            skipped = int((now - job.deadline) // job.interval) + 1
+            job.missed += skipped
+            job.deadline += skipped * job.interval
+            logging.warning('Job {} missed {} deadline(s).'.format(job.name, skipped))
+
+    def stats(self):
+        """Run statistics for every job
+
+        Returns
+        -------
+        dict
+            Job stats (see Job.stats) keyed by job name
+        """
+
+        return {name: job.stats() for name, job in self.jobs.items()}
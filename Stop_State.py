@@ -0,0 +1,116 @@
+import json
+import os
+import time
+
+
+class Stop_State:
+    """Persisted per-position state for trailing stops
+
+    Keeps the high-water mark since entry, the entry price, the last price
+    and the last evaluation time for each held instrument, updated from each
+    cycle's quotes. The state is saved to a compact JSON file so the running
+    high survives restarts. A changed entry price means the position was
+    sold and bought again (or added to), which starts a new high.
+    """
+
+    def __init__(self, path=None):
+        """Stop_State initialization
+
+        Parameters
+        ----------
+        path : str, optional
+            JSON file to load the state from and save it to (the default is None, which keeps the state in memory only)
+        """
+
+        self.path = path
+        self.positions = dict()
+        self.changed = False
+
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                self.positions = json.load(f)
+
+    def get(self, instrument):
+        """State for an instrument
+
+        Parameters
+        ----------
+        instrument : str
+            Instrument URL
+
+        Returns
+        -------
+        dict
+            'symbol', 'high', 'entry_price', 'last' and 'updated' (epoch seconds), or None if not tracked
+        """
+
+        return self.positions.get(instrument)
+
+    def update(self, instrument, symbol, last, entry_price=None):
+        """Records a new price for a position and returns its high-water mark
+
+        Parameters
+        ----------
+        instrument : str
+            Instrument URL
+        symbol : str
+            Ticker symbol
+        last : float
+            Latest trade price
+        entry_price : float, optional
+            Price the position was bought at. Seeds the high for new positions and resets it when it differs from the recorded one. (the default is None)
+
+        Returns
+        -------
+        float
+            Highest price seen since entry
+        """
+
+        state = self.positions.get(instrument)
+        if (state is None or entry_price is not None
+                and state.get('entry_price') not in (None, entry_price)):
+            state = {'symbol': symbol, 'high': max(last, entry_price or 0.0)}
+            self.positions[instrument] = state
+        if entry_price is not None:
+            state['entry_price'] = entry_price
+
+        state['high'] = max(state['high'], last)
+        state['last'] = last
+        state['updated'] = round(time.time(), 3)
+        self.changed = True
+
+        return state['high']
+
+    def prune(self, instruments):
+        """Drops state for positions that are no longer held
+
+        Parameters
+        ----------
+        instruments : iterable of str
+            Instrument URLs still held
+        """
+
+        keep = set(instruments)
+        for instrument in list(self.positions):
+            if instrument not in keep:
+                del self.positions[instrument]
+                self.changed = True
+
+    def save(self, path=None):
+        """Writes the state to a JSON file, if it changed
+
+        Parameters
+        ----------
+        path : str, optional
+            File to write (the default is None, which uses self.path)
+        """
+
+        path = path or self.path
+        if not path or not self.changed:
+            return
+
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.positions, f, separators=(',', ':'))
+        os.replace(tmp, path)
+        self.changed = False
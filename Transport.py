@@ -0,0 +1,189 @@
+"""
+    Shared HTTP transport for Robinhood, Finviz and Zacks.
+
+    All sessions created here mount the same connection pool, so keep-alive
+    connections (and their TLS handshakes) are reused across every client in
+    the process.
+"""
+
+
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import Metrics
+import Rate_Limiter
+
+
+settings = {
+    'pool_connections': 10,     # Number of hosts to keep pools for
+    'pool_maxsize': 20,         # Connections kept alive per host
+    'pool_block': False,        # Wait for a free connection instead of opening extra ones
+    'max_retries': 0,
+    'timeout': (5, 30),         # (connect, read) seconds
+    'throttle_retries': 3,      # Retries for throttled (429/503) responses
+    'backoff': 1.0,             # First retry wait in seconds when there is no Retry-After, doubled each time
+}
+
+_adapter = None
+_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Updates the transport settings
+
+    Settings only apply to the pool created afterwards, so this should be
+    called before any client is created.
+
+    Parameters
+    ----------
+    pool_connections : int, optional
+        Number of host pools to cache.
+    pool_maxsize : int, optional
+        Maximum number of connections to keep alive per host.
+    pool_block : bool, optional
+        Block when the pool is exhausted instead of opening extra connections.
+    max_retries : int, optional
+        Retries for failed connections.
+    timeout : float or tuple, optional
+        Default (connect, read) timeout in seconds for every request.
+    throttle_retries : int, optional
+        Times a throttled (429, or 503 with Retry-After) response is retried.
+    backoff : float, optional
+        First retry wait in seconds for throttled responses without a Retry-After header.
+    """
+
+    global _adapter
+
+    for key in kwargs:
+        assert key in settings, 'Unknown transport setting {}'.format(key)
+
+    with _lock:
+        settings.update(kwargs)
+        _adapter = None
+
+
+def get_adapter():
+    """Returns the process-wide connection pool adapter
+
+    Returns
+    -------
+    requests.adapters.HTTPAdapter
+        Adapter shared by every session created by `new_session`
+    """
+
+    global _adapter
+
+    with _lock:
+        if _adapter is None:
+            _adapter = HTTPAdapter(pool_connections=settings['pool_connections'],
+                                   pool_maxsize=settings['pool_maxsize'],
+                                   pool_block=settings['pool_block'],
+                                   max_retries=settings['max_retries'])
+        return _adapter
+
+
+class Transport_Session(requests.Session):
+    """requests Session with a default timeout, a request counter and metrics
+
+    Every request waits for the host's budget in Rate_Limiter.limiter and is
+    recorded in Metrics.registry under its logical endpoint. Throttled
+    responses pause the host and are retried if the request is safe to
+    repeat: an idempotent method, or a payload carrying a `ref_id`
+    idempotency key. Other requests, such as placing an order, return the
+    throttled response.
+    """
+
+    idempotent_methods = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+    timeout = None
+
+    def __init__(self):
+        super().__init__()
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        host = urlparse(url).hostname
+        attempt = 0
+        while True:
+            Rate_Limiter.limiter.acquire(host)
+            res = self._send(method, url, **kwargs)
+
+            throttled = res.status_code == 429 or (
+                res.status_code == 503 and 'Retry-After' in res.headers)
+            if (not throttled or attempt >= settings['throttle_retries']
+                    or not self._retryable(method, kwargs)):
+                return res
+
+            wait = Rate_Limiter.retry_after(res)
+            if wait is None:
+                wait = settings['backoff'] * 2 ** attempt
+            Rate_Limiter.limiter.pause(host, wait)
+            Metrics.registry.record_retry(url)
+            res.close()
+            attempt += 1
+
+    def _retryable(self, method, kwargs):
+        """Checks whether a request can be sent again without side effects"""
+
+        if method.upper() in self.idempotent_methods:
+            return True
+        for body in (kwargs.get('data'), kwargs.get('json')):
+            if isinstance(body, dict) and body.get('ref_id'):
+                return True
+        return False
+
+    def _send(self, method, url, **kwargs):
+        """Sends one request, counting it and recording its metrics"""
+
+        with self.count_lock:
+            self.request_count += 1
+
+        start = time.perf_counter()
+        try:
+            res = super().request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            Metrics.registry.record_request(method, url, None, time.perf_counter() - start, 0)
+            raise
+
+        if kwargs.get('stream'):
+            size = int(res.headers.get('Content-Length') or 0)
+        else:
+            size = len(res.content)
+        Metrics.registry.record_request(method, url, res.status_code, time.perf_counter() - start, size)
+        return res
+
+
+def new_session(headers=None):
+    """Creates a session on the shared transport
+
+    Each client keeps its own headers and cookies, but the underlying
+    connections come from the shared pool.
+
+    Parameters
+    ----------
+    headers : dict, optional
+        Headers to set on the session (the default is None, which keeps the requests defaults)
+
+    Returns
+    -------
+    Transport_Session
+        Session using the shared connection pool and default timeout
+    """
+
+    session = Transport_Session()
+    adapter = get_adapter()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.timeout = settings['timeout']
+    session.headers['Connection'] = 'keep-alive'
+    if headers:
+        session.headers.update(headers)
+    return session
@@ -1,16 +1,37 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 
+import Html_Extract
+import Metrics
+import Transport
+
 
 class Zacks():    
 
-    def __init__(self):
+    session = None
+    base_url = 'https://www.zacks.com'
+
+    def __init__(self, base_url=None, parser=None):
         """Initialize class
-        
+
+            Creates a session on the shared transport.
+
+        Parameters
+        ----------
+        base_url : str, optional
+            Replaces 'https://www.zacks.com', e.g. to point at a local stand-in server. (the default is None)
+        parser : str, optional
+            HTML extraction backend, see Html_Extract (the default is None, which uses Html_Extract.default_backend)
         """
 
-        pass
+        self.parser = Html_Extract.get_backend(parser)
+
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        Metrics.registry.register({'zacks_quote': self.base_url + '/stock/quote/'})
+
+        headers = dict()
+        headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.87 Safari/537.36'
+        self.session = Transport.new_session(headers=headers)
     
     def quote(self, symbol):
         """Get the Zacks quote for a stock
@@ -26,12 +47,9 @@ class Zacks():
             Request HTML
         """
 
-        url = 'https://www.zacks.com/stock/quote/' + str(symbol).upper()
-        
-        headers = dict()
-        headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.87 Safari/537.36'
+        url = self.base_url + '/stock/quote/' + str(symbol).upper()
 
-        r = requests.get(url=url, headers=headers)
+        r = self.session.get(url=url)
 
         return r.content
     
@@ -57,8 +75,7 @@ class Zacks():
         c = self.quote(symbol=symbol)
 
         # Parse data for rank
-        soup = BeautifulSoup(c, "html.parser")
-        rank_box = '{}'.format(soup.find(name='div', class_='zr_rankbox'))
+        rank_box = self.parser.first_html(c, 'div', 'zr_rankbox') or ''
         try:
             r = '(?:rank_view">\s*)([12345])'
             rank = re.search(r, rank_box).group(1)